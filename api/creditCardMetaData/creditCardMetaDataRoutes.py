@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Query, Request, Response
 from pydantic import BaseModel
 from typing import Optional, List
-import httpx
-import os
+from api.utilities.responseCache import cached, CACHE_TTL_SHORT, CACHE_TTL_NORMAL
+from api.utilities.databaseHelpers import fetch_json
+from api.utilities.postgrestHelpers import query_postgrest_raw, clamp_limit, query_optional, like_pattern, ilike_any, MAX_SEARCH_LENGTH, http_error
 
 # Create API Router
 creditCardMetaData = APIRouter()
@@ -14,18 +15,17 @@ class CreditCard(BaseModel):
     key_features_and_benefits: str
     target_audience: str
 
-# Helper function to make PostgREST requests
-async def query_postgrest(endpoint: str, params: dict = None):
-    """Query PostgREST endpoint"""
-    POSTGREST_URL = os.getenv("POSTGREST_URL")
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{POSTGREST_URL}{endpoint}", params=params)
-        response.raise_for_status()
-        return response.json()
+# Direct Postgres query for /search when DATABASE_URL is set
+SEARCH_CREDIT_CARDS_SQL = "SELECT coalesce(json_agg(r), '[]') FROM (SELECT * FROM search_credit_cards($1) LIMIT $2) r"
+
+# Columns matched by the ILIKE fallback of /search
+SEARCH_COLUMNS = ("card_name", "type", "key_features_and_benefits", "target_audience")
 
 @creditCardMetaData.get("", response_model=List[CreditCard])
+@cached(CACHE_TTL_NORMAL, public=True)
 async def get_credit_cards(
-    limit: Optional[int] = Query(None, description="Limit results"),
+    request: Request,
+    limit: Optional[int] = Query(None, description="Limit results (default 100, max 500)"),
     offset: Optional[int] = Query(None, description="Offset for pagination"),
     card_name: Optional[str] = Query(None, description="Filter by card name"),
     type: Optional[str] = Query(None, description="Filter by type"),
@@ -33,42 +33,53 @@ async def get_credit_cards(
 ):
     """Get credit cards with optional filtering"""
     try:
-        params = {}
+        params = {'limit': clamp_limit(limit)}
         
-        if limit:
-            params['limit'] = limit
         if offset:
             params['offset'] = offset
         if card_name:
-            params['card_name'] = f"ilike.*{card_name}*"
+            params['card_name'] = f"ilike.{like_pattern(card_name)}"
         if type:
-            params['type'] = f"ilike.*{type}*"
+            params['type'] = f"ilike.{like_pattern(type)}"
         if target_audience:
-            params['target_audience'] = f"ilike.*{target_audience}*"
+            params['target_audience'] = f"ilike.{like_pattern(target_audience)}"
             
-        data = await query_postgrest("/bob_credit_card_types", params)
-        return data
+        # Content-Range carries the planner-estimated total so clients can paginate
+        return await query_postgrest_raw(request, "/bob_credit_card_types", params, headers={"Prefer": "count=planned"})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @creditCardMetaData.get("/search", response_model=List[CreditCard])
+@cached(CACHE_TTL_SHORT, public=True)
 async def search_credit_cards(
-    q: str = Query(..., description="Search query"),
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=MAX_SEARCH_LENGTH, description="Search query"),
     limit: Optional[int] = Query(10, description="Limit results")
 ):
     """Search credit cards across all fields"""
     try:
+        # Full-text search ranked by relevance (sql/002_full_text_search.sql)
+        body = await fetch_json(request, SEARCH_CREDIT_CARDS_SQL, q, clamp_limit(limit))
+        if body is not None:
+            return Response(body, media_type="application/json")
+
+        response = await query_optional(request, "/rpc/search_credit_cards", {'q': q, 'limit': clamp_limit(limit)}, raw=True)
+        if response is not None:
+            return response
+
+        # Fallback when the sql/ migrations are not applied
         params = {
-            'or': f"(card_name.ilike.*{q}*,type.ilike.*{q}*,key_features_and_benefits.ilike.*{q}*,target_audience.ilike.*{q}*)",
-            'limit': limit
+            'or': ilike_any(SEARCH_COLUMNS, q),
+            'limit': clamp_limit(limit)
         }
-        data = await query_postgrest("/bob_credit_card_types", params)
-        return data
+        return await query_postgrest_raw(request, "/bob_credit_card_types", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @creditCardMetaData.get("/by_type", response_model=List[CreditCard])
+@cached(CACHE_TTL_NORMAL, public=True)
 async def get_cards_by_type(
+    request: Request,
     card_type: str = Query(..., description="Card type to filter by"),
     limit: Optional[int] = Query(10, description="Limit results")
 ):
@@ -76,9 +87,8 @@ async def get_cards_by_type(
     try:
         params = {
             'type': f"eq.{card_type}",
-            'limit': limit
+            'limit': clamp_limit(limit)
         }
-        data = await query_postgrest("/bob_credit_card_types", params)
-        return data
+        return await query_postgrest_raw(request, "/bob_credit_card_types", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Query, Request, Response
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Union
-import httpx
-import os
+from collections import Counter
+from api.utilities.responseCache import cached, CACHE_TTL_SHORT, CACHE_TTL_NORMAL, CACHE_TTL_LONG
+from api.utilities.dateHelpers import date_str
+from api.utilities.databaseHelpers import fetch_json
+from api.utilities.postgrestHelpers import query_postgrest, query_postgrest_raw, clamp_limit, query_optional, like_pattern, ilike_any, MAX_SEARCH_LENGTH, http_error
 
 # Create API Router for customer metadata
 customerMetaDataRouter = APIRouter()
@@ -34,72 +37,91 @@ class CustomerCreditCardHolder(BaseModel):
     bonus_reward_points_redeemed_expired: int = Field(..., alias="Bonus/Reward Points Redeemed/Expired")
     bonus_reward_points_closing: int = Field(..., alias="Bonus/Reward Points Closing")
 
-    class Config:
-        populate_by_name = True
-
-# Helper function to make PostgREST requests
-async def query_postgrest(endpoint: str, params: dict = None, method: str = "GET"):
-    """Query PostgREST endpoint"""
-    POSTGREST_URL = os.getenv("POSTGREST_URL")
-    async with httpx.AsyncClient() as client:
-        if method == "GET":
-            response = await client.get(f"{POSTGREST_URL}{endpoint}", params=params)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        response.raise_for_status()
-        return response.json() if response.content else []
+    model_config = ConfigDict(populate_by_name=True)
+
+# Direct Postgres query for /search when DATABASE_URL is set
+SEARCH_CUSTOMERS_SQL = "SELECT coalesce(json_agg(r), '[]') FROM (SELECT * FROM search_customers($1) LIMIT $2) r"
+
+# Columns matched by the ILIKE fallback of /search
+SEARCH_COLUMNS = ("Cardholder Name", "Card No.", "Card Type", "State")
+
+# PostgREST select for each supported `embed` value (sql/004_card_type_embedding.sql)
+EMBED_SELECTS = {"card_type": "*,card_types(*)"}
 
 @customerMetaDataRouter.get("/search", response_model=List[CustomerCreditCardHolder])
+@cached(CACHE_TTL_SHORT)
 async def search_customers(
-    q: str = Query(..., description="Search query - searches across name, card number, and card type"),
-    limit: Optional[int] = Query(10, description="Limit results")
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=MAX_SEARCH_LENGTH, description="Search query - searches across name, card number, and card type"),
+    limit: Optional[int] = Query(10, description="Limit results"),
+    embed: Optional[str] = Query(None, pattern="^card_type$", description="Include related rows in one query: card_type adds the matching credit card types as `card_types`")
 ):
     """Generic search across customer name, card number, and card type"""
     try:
+        # Full-text search ranked by relevance (sql/002_full_text_search.sql)
+        if not embed:
+            body = await fetch_json(request, SEARCH_CUSTOMERS_SQL, q, clamp_limit(limit))
+            if body is not None:
+                return Response(body, media_type="application/json")
+
+        params = {'q': q, 'limit': clamp_limit(limit)}
+        if embed:
+            params['select'] = EMBED_SELECTS[embed]
+        response = await query_optional(request, "/rpc/search_customers", params, key=f"/rpc/search_customers?embed={embed}", raw=True)
+        if response is not None:
+            return response
+
+        # Fallback when the sql/ migrations are not applied
         params = {
-            'or': f"(Cardholder Name.ilike.*{q}*,Card No..ilike.*{q}*,Card Type.ilike.*{q}*,State.ilike.*{q}*)",
-            'limit': limit
+            'or': ilike_any(SEARCH_COLUMNS, q),
+            'limit': clamp_limit(limit)
         }
-        data = await query_postgrest("/bob_credit_card_holders", params)
-        return data
+        if embed:
+            params['select'] = EMBED_SELECTS[embed]
+        return await query_postgrest_raw(request, "/bob_credit_card_holders", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/search_by_name", response_model=List[CustomerCreditCardHolder])
+@cached(CACHE_TTL_SHORT)
 async def search_customers_by_name(
-    name: str = Query(..., description="Customer name to search for")
+    request: Request,
+    name: str = Query(..., min_length=1, max_length=MAX_SEARCH_LENGTH, description="Customer name to search for"),
+    limit: Optional[int] = Query(10, description="Limit results")
 ):
     """Search customers by cardholder name"""
     try:
         params = {
-            'Cardholder Name': f"ilike.*{name}*",
+            'Cardholder Name': f"ilike.{like_pattern(name)}",
+            'limit': clamp_limit(limit),
             'order': 'Cardholder Name.asc'
         }
-        data = await query_postgrest("/bob_credit_card_holders", params)
-        return data
+        return await query_postgrest_raw(request, "/bob_credit_card_holders", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/search_by_card_number", response_model=List[CustomerCreditCardHolder])
+@cached(CACHE_TTL_SHORT)
 async def search_customers_by_card_number(
-    card_number: str = Query(..., description="Card number (can be partial, e.g., last 4 digits)"),
+    request: Request,
+    card_number: str = Query(..., min_length=1, max_length=MAX_SEARCH_LENGTH, description="Card number (can be partial, e.g., last 4 digits)"),
     limit: Optional[int] = Query(10, description="Limit results")
 ):
     """Search customers by card number (supports partial matching)"""
     try:
         params = {
-            'Card No.': f"ilike.*{card_number}*",
-            'limit': limit,
+            'Card No.': f"ilike.{like_pattern(card_number)}",
+            'limit': clamp_limit(limit),
             'order': 'Cardholder Name.asc'
         }
-        data = await query_postgrest("/bob_credit_card_holders", params)
-        return data
+        return await query_postgrest_raw(request, "/bob_credit_card_holders", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/search_by_card_type", response_model=List[CustomerCreditCardHolder])
+@cached(CACHE_TTL_SHORT)
 async def search_customers_by_card_type(
+    request: Request,
     card_type: str = Query(..., description="Card type to filter by"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
@@ -107,55 +129,69 @@ async def search_customers_by_card_type(
     try:
         params = {
             'Card Type': f"eq.{card_type}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'Cardholder Name.asc'
         }
-        data = await query_postgrest("/bob_credit_card_holders", params)
-        return data
+        return await query_postgrest_raw(request, "/bob_credit_card_holders", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/search_by_state", response_model=List[CustomerCreditCardHolder])
+@cached(CACHE_TTL_SHORT)
 async def search_customers_by_state(
-    state: str = Query(..., description="State to filter by"),
+    request: Request,
+    state: str = Query(..., min_length=1, max_length=MAX_SEARCH_LENGTH, description="State to filter by"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
     """Search customers by state"""
     try:
         params = {
-            'State': f"ilike.*{state}*",
-            'limit': limit,
+            'State': f"ilike.{like_pattern(state)}",
+            'limit': clamp_limit(limit),
             'order': 'Cardholder Name.asc'
         }
-        data = await query_postgrest("/bob_credit_card_holders", params)
-        return data
+        return await query_postgrest_raw(request, "/bob_credit_card_holders", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/card_types", response_model=List[str])
-async def get_card_types():
+@cached(CACHE_TTL_LONG, public=True)
+async def get_card_types(request: Request):
     """Get all unique card types"""
     try:
+        response = await query_optional(request, "/rpc/bob_card_types", raw=True)
+        if response is not None:
+            return response
+
+        # Fallback when the sql/ migrations are not applied
         params = {'select': 'Card Type'}
-        data = await query_postgrest("/bob_credit_card_holders", params)
+        data = await query_postgrest(request, "/bob_credit_card_holders", params)
         card_types = list(set([item['Card Type'] for item in data if item['Card Type']]))
         return sorted(card_types)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/states", response_model=List[str])
-async def get_states():
+@cached(CACHE_TTL_LONG, public=True)
+async def get_states(request: Request):
     """Get all unique states"""
     try:
+        response = await query_optional(request, "/rpc/bob_states", raw=True)
+        if response is not None:
+            return response
+
+        # Fallback when the sql/ migrations are not applied
         params = {'select': 'State'}
-        data = await query_postgrest("/bob_credit_card_holders", params)
+        data = await query_postgrest(request, "/bob_credit_card_holders", params)
         states = list(set([item['State'] for item in data if item['State']]))
         return sorted(states)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/high_credit_limit", response_model=List[CustomerCreditCardHolder])
+@cached(CACHE_TTL_NORMAL)
 async def get_high_credit_limit_customers(
+    request: Request,
     min_limit: int = Query(100000, description="Minimum credit limit"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
@@ -163,43 +199,49 @@ async def get_high_credit_limit_customers(
     try:
         params = {
             'Credit Limit': f"gte.{min_limit}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'Credit Limit.desc'
         }
-        data = await query_postgrest("/bob_credit_card_holders", params)
-        return data
+        return await query_postgrest_raw(request, "/bob_credit_card_holders", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/payment_due_soon", response_model=List[CustomerCreditCardHolder])
+@cached(CACHE_TTL_NORMAL)
 async def get_customers_payment_due_soon(
+    request: Request,
     days_ahead: int = Query(7, description="Number of days ahead to check for due payments"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
     """Get customers with payments due soon"""
     try:
-        from datetime import datetime, timedelta
-        
         # Calculate the target date
-        target_date = datetime.now() + timedelta(days=days_ahead)
-        target_date_str = target_date.strftime("%d/%m/%Y")
+        target_date_str = date_str("%d/%m/%Y", days_ahead)
         
         params = {
             'Payment Due Date': f"lte.{target_date_str}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'Payment Due Date.asc'
         }
-        data = await query_postgrest("/bob_credit_card_holders", params)
-        return data
+        return await query_postgrest_raw(request, "/bob_credit_card_holders", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @customerMetaDataRouter.get("/statistics")
-async def get_customer_statistics():
+@cached(CACHE_TTL_LONG, public=True)
+async def get_customer_statistics(request: Request):
     """Get basic statistics about customers"""
     try:
-        # Get all customers for statistics
-        all_customers = await query_postgrest("/bob_credit_card_holders", {})
+        stats = await query_optional(request, "/rpc/bob_customer_stats")
+        if stats is not None:
+            if not stats['total_customers']:
+                return {"message": "No customer data found"}
+            return stats
+
+        # Fallback when the sql/ migrations are not applied: aggregate in Python.
+        # Only the aggregated columns are fetched, so every row has exactly these keys.
+        params = {'select': 'Card Type,State,Credit Limit'}
+        all_customers = await query_postgrest(request, "/bob_credit_card_holders", params)
         
         if not all_customers:
             return {"message": "No customer data found"}
@@ -207,23 +249,18 @@ async def get_customer_statistics():
         # Calculate statistics
         total_customers = len(all_customers)
         
-        # Card type distribution
-        card_types = {}
+        # Card type / state distributions and credit limits in one pass;
+        # missing values count as 'Unknown' like the SQL function
+        card_types = Counter()
+        states = Counter()
         credit_limits = []
-        states = {}
         
         for customer in all_customers:
-            # Card type stats
-            card_type = customer.get('Card Type', 'Unknown')
-            card_types[card_type] = card_types.get(card_type, 0) + 1
-            
-            # Credit limit stats
-            if customer.get('Credit Limit'):
-                credit_limits.append(customer['Credit Limit'])
-            
-            # State stats
-            state = customer.get('State', 'Unknown')
-            states[state] = states.get(state, 0) + 1
+            card_types[customer['Card Type'] or 'Unknown'] += 1
+            states[customer['State'] or 'Unknown'] += 1
+            credit_limit = customer['Credit Limit']
+            if credit_limit:
+                credit_limits.append(credit_limit)
         
         # Calculate credit limit statistics
         avg_credit_limit = sum(credit_limits) / len(credit_limits) if credit_limits else 0
@@ -232,13 +269,14 @@ async def get_customer_statistics():
         
         return {
             "total_customers": total_customers,
-            "card_type_distribution": card_types,
+            "card_type_distribution": dict(card_types),
             "credit_limit_stats": {
                 "average": round(avg_credit_limit, 2),
                 "maximum": max_credit_limit,
                 "minimum": min_credit_limit
             },
-            "top_5_states": dict(sorted(states.items(), key=lambda x: x[1], reverse=True)[:5])
+            # most_common(n) uses a heap rather than sorting every state
+            "top_5_states": dict(states.most_common(5))
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Query, Request, Response
 from pydantic import BaseModel, Field
 from typing import Optional, List
-import httpx
-import os
+from api.utilities.responseCache import cached, CACHE_TTL_SHORT, CACHE_TTL_NORMAL, CACHE_TTL_LONG
+from api.utilities.dateHelpers import date_str
+from api.utilities.databaseHelpers import fetch_json
+from api.utilities.postgrestHelpers import query_postgrest, query_postgrest_raw, clamp_limit, query_optional, ilike_any, MAX_SEARCH_LENGTH, http_error
 
 # Create API Router for offers
 offerRouter = APIRouter()
@@ -25,46 +27,44 @@ class Offer(BaseModel):
     how_to_redeem: str
     avail_offer_link: Optional[str] = None
 
+# Direct Postgres queries for hot endpoints when DATABASE_URL is set
+ACTIVE_OFFERS_SQL = "SELECT coalesce(json_agg(r), '[]') FROM (SELECT * FROM offers WHERE valid_till >= $1 ORDER BY valid_till LIMIT $2) r"
+SEARCH_OFFERS_SQL = "SELECT coalesce(json_agg(r), '[]') FROM (SELECT * FROM search_offers($1) LIMIT $2) r"
 
-
-# Helper function to make PostgREST requests
-async def query_postgrest(endpoint: str, params: dict = None, method: str = "GET", data: dict = None):
-    """Query PostgREST endpoint"""
-    POSTGREST_URL = os.getenv("POSTGREST_URL")
-    async with httpx.AsyncClient() as client:
-        if method == "GET":
-            response = await client.get(f"{POSTGREST_URL}{endpoint}", params=params)
-        elif method == "POST":
-            response = await client.post(f"{POSTGREST_URL}{endpoint}", json=data, params=params)
-        elif method == "PATCH":
-            response = await client.patch(f"{POSTGREST_URL}{endpoint}", json=data, params=params)
-        elif method == "DELETE":
-            response = await client.delete(f"{POSTGREST_URL}{endpoint}", params=params)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        response.raise_for_status()
-        return response.json() if response.content else None
-
+# Columns matched by the ILIKE fallback of /search
+SEARCH_COLUMNS = ("title", "description", "category", "brand", "offer_details")
 
 @offerRouter.get("/search", response_model=List[Offer])
+@cached(CACHE_TTL_SHORT, public=True)
 async def search_offers(
-    q: str = Query(..., description="Search query"),
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=MAX_SEARCH_LENGTH, description="Search query"),
     limit: Optional[int] = Query(10, description="Limit results")
 ):
     """Search offers across multiple fields"""
     try:
+        # Full-text search ranked by relevance (sql/002_full_text_search.sql)
+        body = await fetch_json(request, SEARCH_OFFERS_SQL, q, clamp_limit(limit))
+        if body is not None:
+            return Response(body, media_type="application/json")
+
+        response = await query_optional(request, "/rpc/search_offers", {'q': q, 'limit': clamp_limit(limit)}, raw=True)
+        if response is not None:
+            return response
+
+        # Fallback when the sql/ migrations are not applied
         params = {
-            'or': f"(title.ilike.*{q}*,description.ilike.*{q}*,category.ilike.*{q}*,brand.ilike.*{q}*,offer_details.ilike.*{q}*)",
-            'limit': limit
+            'or': ilike_any(SEARCH_COLUMNS, q),
+            'limit': clamp_limit(limit)
         }
-        data = await query_postgrest("/offers", params)
-        return data
+        return await query_postgrest_raw(request, "/offers", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @offerRouter.get("/by_category", response_model=List[Offer])
+@cached(CACHE_TTL_NORMAL, public=True)
 async def get_offers_by_category(
+    request: Request,
     category: str = Query(..., description="Category to filter by"),
     limit: Optional[int] = Query(10, description="Limit results")
 ):
@@ -72,15 +72,16 @@ async def get_offers_by_category(
     try:
         params = {
             'category': f"eq.{category}",
-            'limit': limit
+            'limit': clamp_limit(limit)
         }
-        data = await query_postgrest("/offers", params)
-        return data
+        return await query_postgrest_raw(request, "/offers", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @offerRouter.get("/by_brand", response_model=List[Offer])
+@cached(CACHE_TTL_NORMAL, public=True)
 async def get_offers_by_brand(
+    request: Request,
     brand: str = Query(..., description="Brand to filter by"),
     limit: Optional[int] = Query(10, description="Limit results")
 ):
@@ -88,60 +89,75 @@ async def get_offers_by_brand(
     try:
         params = {
             'brand': f"eq.{brand}",
-            'limit': limit
+            'limit': clamp_limit(limit)
         }
-        data = await query_postgrest("/offers", params)
-        return data
+        return await query_postgrest_raw(request, "/offers", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @offerRouter.get("/active", response_model=List[Offer])
+@cached(CACHE_TTL_NORMAL, public=True)
 async def get_active_offers(
+    request: Request,
     limit: Optional[int] = Query(10, description="Limit results")
 ):
     """Get currently active offers (based on valid_till date)"""
     try:
-        from datetime import datetime
-        today = datetime.now().strftime("%d-%m-%Y")
+        today = date_str("%d-%m-%Y")
+        body = await fetch_json(request, ACTIVE_OFFERS_SQL, today, clamp_limit(limit))
+        if body is not None:
+            return Response(body, media_type="application/json")
+
         params = {
             'valid_till': f"gte.{today}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'valid_till.asc'
         }
-        data = await query_postgrest("/offers", params)
-        return data
+        return await query_postgrest_raw(request, "/offers", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
  #future use
 # @offerRouter.delete("/{offer_id}")
-# async def delete_offer(offer_id: int):
+# async def delete_offer(request: Request, offer_id: int):
 #     """Delete an offer"""
 #     try:
 #         params = {'id': f"eq.{offer_id}"}
-#         await query_postgrest("/offers", method="DELETE", params=params)
+#         await query_postgrest(request, "/offers", method="DELETE", params=params)
 #         return {"message": f"Offer {offer_id} deleted successfully"}
 #     except Exception as e:
-#         raise HTTPException(status_code=500, detail=str(e))
+#         raise http_error(e)
 
 @offerRouter.get("/categories", response_model=List[str])
-async def get_offer_categories():
+@cached(CACHE_TTL_LONG, public=True)
+async def get_offer_categories(request: Request):
     """Get all unique offer categories"""
     try:
+        response = await query_optional(request, "/rpc/offer_categories", raw=True)
+        if response is not None:
+            return response
+
+        # Fallback when the sql/ migrations are not applied
         params = {'select': 'category'}
-        data = await query_postgrest("/offers", params)
+        data = await query_postgrest(request, "/offers", params)
         categories = list(set([item['category'] for item in data if item['category']]))
         return sorted(categories)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @offerRouter.get("/brands", response_model=List[str])
-async def get_offer_brands():
+@cached(CACHE_TTL_LONG, public=True)
+async def get_offer_brands(request: Request):
     """Get all unique offer brands"""
     try:
+        response = await query_optional(request, "/rpc/offer_brands", raw=True)
+        if response is not None:
+            return response
+
+        # Fallback when the sql/ migrations are not applied
         params = {'select': 'brand'}
-        data = await query_postgrest("/offers", params)
+        data = await query_postgrest(request, "/offers", params)
         brands = list(set([item['brand'] for item in data if item['brand']]))
         return sorted(brands)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise http_error(e) 
\ No newline at end of file
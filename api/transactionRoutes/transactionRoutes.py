@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel, Field
-from typing import Optional, List, Union
-import httpx
-import os
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Dict, Union
+import asyncio
+import calendar
+import heapq
+import math
 import re
+from collections import Counter, defaultdict
+from functools import lru_cache
 from datetime import datetime, timedelta
+from api.utilities.responseCache import cached, CACHE_TTL_SHORT, CACHE_TTL_LONG
+from api.utilities.databaseHelpers import fetch_json
+from api.utilities.postgrestHelpers import count_rows, query_postgrest, query_postgrest_raw, query_optional, clamp_limit, like_escape, like_pattern, ilike_any, MAX_SEARCH_LENGTH, http_error
 
 # Create API Router for transactions
 transactionRouter = APIRouter()
@@ -21,58 +28,148 @@ class Transaction(BaseModel):
     amount: str
     mcc: int = Field(..., alias="MCC")
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
-# Helper function to make PostgREST requests
-async def query_postgrest(endpoint: str, params: dict = None, method: str = "GET"):
-    """Query PostgREST endpoint"""
-    POSTGREST_URL = os.getenv("POSTGREST_URL")
-    async with httpx.AsyncClient() as client:
-        if method == "GET":
-            response = await client.get(f"{POSTGREST_URL}{endpoint}", params=params)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        response.raise_for_status()
-        return response.json() if response.content else []
+# Direct Postgres queries for the hot searches when DATABASE_URL is set. asyncpg
+# prepares each one once per connection, so repeated calls skip parse and plan.
+SEARCH_BY_CARD_SQL = "SELECT coalesce(json_agg(r), '[]') FROM (SELECT * FROM transactions WHERE card_no ILIKE $1 ORDER BY txn_date DESC LIMIT $2) r"
+SEARCH_BY_MCC_SQL = "SELECT coalesce(json_agg(r), '[]') FROM (SELECT * FROM transactions WHERE \"MCC\" = $1 ORDER BY txn_date DESC LIMIT $2) r"
+SEARCH_BY_CARD_AND_MCC_SQL = "SELECT coalesce(json_agg(r), '[]') FROM (SELECT * FROM transactions WHERE card_no ILIKE $1 AND \"MCC\" = $2 ORDER BY txn_date DESC LIMIT $3) r"
+
+# Columns matched by /search
+SEARCH_COLUMNS = ("card_no", "particulars", "ref_no")
+
+# Most queries accepted by /batch, and how many of them run at once
+MAX_BATCH_QUERIES = 20
+BATCH_CONCURRENCY = 10
+
+# One query of a /batch request, run against /transactions
+class BatchQuery(BaseModel):
+    params: Dict[str, str] = Field(default_factory=dict, description="PostgREST filters, e.g. {\"card_no\": \"ilike.*1234*\", \"MCC\": \"eq.5411\"}")
+    limit: Optional[int] = Field(20, description="Limit results")
+
+# Columns read by the Python aggregate fallbacks, so they skip the rest of each row.
+# PostgREST returns every selected column (null when empty), so rows are indexed directly.
+SUMMARY_COLUMNS = "MCC,source_amt,source_currency"
+AGGREGATE_COLUMNS = "card_no,txn_date,source_amt,reward_points,MCC"
+MERCHANT_AGGREGATE_COLUMNS = "txn_date,particulars,source_amt,reward_points,MCC"
+
+# DD/MM/YYYY, validated before dates are sliced by date_key / date_range_filter
+DATE_PATTERN = re.compile(r'^\d{2}/\d{2}/\d{4}$')
+
+# Longest range (in months) the date-range fallback pre-filters by month
+MAX_PREFILTER_MONTHS = 24
+
+# Build an or=(...) filter matching the months a date range spans, so the
+# fallback only downloads rows from those months. None for very long ranges.
+def month_filter(from_key: tuple, to_key: tuple):
+    (year, month, _), (to_year, to_month, _) = from_key, to_key
+    count = (to_year - year) * 12 + to_month - month + 1
+    if not 0 < count <= MAX_PREFILTER_MONTHS:
+        return None
+    patterns = []
+    for _ in range(count):
+        patterns.append(f"txn_date.like.*/{month:02d}/{year:04d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return "(" + ",".join(patterns) + ")"
+
+# Key under which a missing txn_date_iso computed field is remembered
+TXN_DATE_ISO_KEY = "/transactions?txn_date_iso"
+
+# Sortable (year, month, day) tuple for a DD/MM/YYYY date, or None if it is
+# malformed or impossible (e.g. 31/02/2025), the same dates txn_date_iso()
+# (sql/007) rejects. Slicing avoids strptime re-parsing the format string for
+# every row, and rows from the same day share a txn_date string, so results
+# are memoized.
+@lru_cache(maxsize=4096)
+def date_key(value: str):
+    if not isinstance(value, str) or not value.isascii() or not DATE_PATTERN.fullmatch(value):
+        return None
+    year, month, day = int(value[6:10]), int(value[3:5]), int(value[0:2])
+    try:
+        if year and 1 <= day <= calendar.monthrange(year, month)[1]:
+            return (year, month, day)
+    except ValueError:
+        # Month outside 1-12
+        pass
+    return None
+
+# datetime for a DD/MM/YYYY date, or None if invalid. Aggregates see the same
+# txn_date on many rows, so strptime runs once per distinct string.
+@lru_cache(maxsize=4096)
+def parse_txn_date(value: str):
+    try:
+        return datetime.strptime(value, "%d/%m/%Y")
+    except (TypeError, ValueError):
+        return None
+
+# Mask a card number for privacy, showing only the last 4 digits
+def mask_card(card_no: str) -> str:
+    return "****-****-****-" + card_no[-4:] if len(card_no) >= 4 else card_no
+
+# YYYY-MM-DD form of a validated DD/MM/YYYY date, as Postgres reads dates
+def iso_date(value: str) -> str:
+    return f"{value[6:10]}-{value[3:5]}-{value[0:2]}"
+
+# The n groups with the largest 'amount', same as sorted(..., reverse=True)[:n]
+# but without sorting every group when only the top few are returned
+def top_groups(groups: dict, n):
+    if n is None or n < 0:
+        return dict(sorted(groups.items(), key=lambda x: x[1]['amount'], reverse=True)[:n])
+    return dict(heapq.nlargest(n, groups.items(), key=lambda x: x[1]['amount']))
+
+# Build an and=(...) filter on txn_date_iso from two validated DD/MM/YYYY dates
+def date_range_filter(from_date: str, to_date: str) -> str:
+    return f"(txn_date_iso.gte.{iso_date(from_date)},txn_date_iso.lte.{iso_date(to_date)})"
 
 @transactionRouter.get("/search_by_card_number", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_card_number(
+    request: Request,
     card_number: str = Query(..., description="Card number (supports partial matching, e.g., last 4 digits or masked format)"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
     """Search transactions by card number"""
     try:
+        body = await fetch_json(request, SEARCH_BY_CARD_SQL, f"%{like_escape(card_number)}%", clamp_limit(limit))
+        if body is not None:
+            return Response(body, media_type="application/json")
+
         params = {
-            'card_no': f"ilike.*{card_number}*",
-            'limit': limit,
+            'card_no': f"ilike.{like_pattern(card_number)}",
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_mcc", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_mcc(
+    request: Request,
     mcc: int = Query(..., description="Merchant Category Code (MCC)"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
     """Search transactions by MCC (Merchant Category Code)"""
     try:
+        body = await fetch_json(request, SEARCH_BY_MCC_SQL, mcc, clamp_limit(limit))
+        if body is not None:
+            return Response(body, media_type="application/json")
+
         params = {
             'MCC': f"eq.{mcc}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_month", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_month(
+    request: Request,
     month: int = Query(..., description="Month (1-12)", ge=1, le=12),
     year: int = Query(..., description="Year (e.g., 2025)"),
     card_number: Optional[str] = Query(None, description="Optional card number filter"),
@@ -87,21 +184,22 @@ async def search_transactions_by_month(
         
         params = {
             'txn_date': f"like.{date_pattern}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
         
         # Add card number filter if provided
         if card_number:
-            params['card_no'] = f"ilike.*{card_number}*"
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
         
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_date_range", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_date_range(
+    request: Request,
     from_date: str = Query(..., description="From date in DD/MM/YYYY format (e.g., 01/06/2025)"),
     to_date: str = Query(..., description="To date in DD/MM/YYYY format (e.g., 30/06/2025)"),
     card_number: Optional[str] = Query(None, description="Optional card number filter"),
@@ -110,46 +208,54 @@ async def search_transactions_by_date_range(
     """Search transactions within a date range"""
     try:
         # Validate date format
-        date_pattern = r'^\d{2}/\d{2}/\d{4}$'
-        if not re.match(date_pattern, from_date) or not re.match(date_pattern, to_date):
+        if not DATE_PATTERN.match(from_date) or not DATE_PATTERN.match(to_date):
             raise HTTPException(status_code=400, detail="Date format must be DD/MM/YYYY")
         
-        # Since PostgREST doesn't handle date comparison well with DD/MM/YYYY text format,
-        # we'll get all transactions and filter in Python for now
-        # For production, consider converting to proper date fields in the database
-        
-        params = {'limit': 1000}  # Get more records for filtering
+        # Range filter and ordering on the indexed txn_date_iso field (sql/007_transaction_date_index.sql)
+        params = {
+            'and': date_range_filter(from_date, to_date),
+            'order': 'txn_date_iso.desc',
+            'limit': clamp_limit(limit)
+        }
         if card_number:
-            params['card_no'] = f"ilike.*{card_number}*"
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
         
-        data = await query_postgrest("/transactions", params)
+        response = await query_optional(request, "/transactions", params, key=TXN_DATE_ISO_KEY, raw=True)
+        if response is not None:
+            return response
         
-        # Convert date strings to datetime objects for comparison
-        def parse_date(date_str):
-            try:
-                return datetime.strptime(date_str, "%d/%m/%Y")
-            except:
-                return None
+        # Fallback when the sql/ migrations are not applied: filter in Python
+        from_key = date_key(from_date)
+        to_key = date_key(to_date)
+        if from_key is None or to_key is None:
+            raise HTTPException(status_code=400, detail="Invalid date")
         
-        from_dt = parse_date(from_date)
-        to_dt = parse_date(to_date)
+        params = {'limit': 1000}  # Get more records for filtering
+        if card_number:
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
+        months = month_filter(from_key, to_key)
+        if months:
+            params['or'] = months
         
-        # Filter transactions within date range
-        filtered_data = []
-        for transaction in data:
-            txn_dt = parse_date(transaction.get('txn_date', ''))
-            if txn_dt and from_dt <= txn_dt <= to_dt:
-                filtered_data.append(transaction)
+        data = await query_postgrest(request, "/transactions", params)
         
-        # Sort by date (newest first) and limit results
-        filtered_data.sort(key=lambda x: parse_date(x.get('txn_date', '')), reverse=True)
-        return filtered_data[:limit]
+        # Filter transactions within date range, keeping each row's date key for the sort
+        filtered_data = [
+            (txn_key, transaction) for transaction in data
+            if (txn_key := date_key(transaction.get('txn_date', ''))) and from_key <= txn_key <= to_key
+        ]
+        
+        # Newest first, limited; nlargest only keeps `limit` rows instead of sorting them all
+        newest = heapq.nlargest(clamp_limit(limit), filtered_data, key=lambda x: x[0])
+        return [transaction for _, transaction in newest]
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_specific_date", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_specific_date(
+    request: Request,
     date: str = Query(..., description="Specific date in DD/MM/YYYY format (e.g., 30/06/2025)"),
     card_number: Optional[str] = Query(None, description="Optional card number filter"),
     limit: Optional[int] = Query(20, description="Limit results")
@@ -157,44 +263,45 @@ async def search_transactions_by_specific_date(
     """Search transactions on a specific date"""
     try:
         # Validate date format
-        date_pattern = r'^\d{2}/\d{2}/\d{4}$'
-        if not re.match(date_pattern, date):
+        if not DATE_PATTERN.match(date):
             raise HTTPException(status_code=400, detail="Date format must be DD/MM/YYYY")
         
         params = {
             'txn_date': f"eq.{date}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
         
         # Add card number filter if provided
         if card_number:
-            params['card_no'] = f"ilike.*{card_number}*"
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
         
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_merchant", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_merchant(
+    request: Request,
     merchant: str = Query(..., description="Merchant name or particulars search"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
     """Search transactions by merchant name in particulars field"""
     try:
         params = {
-            'particulars': f"ilike.*{merchant}*",
-            'limit': limit,
+            'particulars': f"ilike.{like_pattern(merchant)}",
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_high_value", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_high_value_transactions(
+    request: Request,
     min_amount: float = Query(1000.0, description="Minimum transaction amount"),
     card_number: Optional[str] = Query(None, description="Optional card number filter"),
     limit: Optional[int] = Query(20, description="Limit results")
@@ -203,66 +310,71 @@ async def search_high_value_transactions(
     try:
         params = {
             'source_amt': f"gte.{min_amount}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'source_amt.desc'
         }
         
         # Add card number filter if provided
         if card_number:
-            params['card_no'] = f"ilike.*{card_number}*"
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
         
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/get_mcc_categories", response_model=List[int])
-async def get_unique_mcc_codes():
+@cached(CACHE_TTL_LONG)
+async def get_unique_mcc_codes(request: Request):
     """Get all unique MCC codes in the system"""
     try:
+        response = await query_optional(request, "/rpc/transaction_mcc_codes", raw=True)
+        if response is not None:
+            return response
+
+        # Fallback when the sql/ migrations are not applied
         params = {'select': 'MCC'}
-        data = await query_postgrest("/transactions", params)
+        data = await query_postgrest(request, "/transactions", params)
         mcc_codes = list(set([item['MCC'] for item in data if item.get('MCC')]))
         return sorted(mcc_codes)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/get_transaction_summary")
+@cached(CACHE_TTL_LONG)
 async def get_transaction_summary(
+    request: Request,
     card_number: Optional[str] = Query(None, description="Optional card number filter")
 ):
     """Get transaction summary statistics"""
     try:
-        params = {}
+        # Whole summary computed in one pass in the database (sql/013_transaction_summary_single_pass.sql)
+        rpc_params = {'card': like_escape(card_number)} if card_number else None
+        response = await query_optional(request, "/rpc/transaction_summary", rpc_params, raw=True)
+        if response is not None:
+            return response
+        
+        # Fallback when the sql/ migrations are not applied
+        params = {'select': SUMMARY_COLUMNS}
         if card_number:
-            params['card_no'] = f"ilike.*{card_number}*"
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
         
         # Get all transactions for analysis
-        data = await query_postgrest("/transactions", params)
+        data = await query_postgrest(request, "/transactions", params)
         
         if not data:
             return {"message": "No transaction data found"}
         
         # Calculate statistics
         total_transactions = len(data)
-        amounts = [item.get('source_amt', 0) for item in data if item.get('source_amt')]
+        amounts = [amount for item in data if (amount := item['source_amt'])]
         total_amount = sum(amounts)
         avg_amount = total_amount / len(amounts) if amounts else 0
         max_amount = max(amounts) if amounts else 0
         min_amount = min(amounts) if amounts else 0
         
-        # MCC distribution
-        mcc_distribution = {}
-        for transaction in data:
-            mcc = transaction.get('MCC')
-            if mcc:
-                mcc_distribution[mcc] = mcc_distribution.get(mcc, 0) + 1
-        
-        # Currency distribution
-        currency_distribution = {}
-        for transaction in data:
-            currency = transaction.get('source_currency', 'Unknown')
-            currency_distribution[currency] = currency_distribution.get(currency, 0) + 1
+        # MCC and currency distributions
+        mcc_distribution = Counter(mcc for item in data if (mcc := item['MCC']))
+        currency_distribution = Counter(item['source_currency'] for item in data)
         
         return {
             "total_transactions": total_transactions,
@@ -270,33 +382,40 @@ async def get_transaction_summary(
             "average_amount": round(avg_amount, 2),
             "maximum_amount": max_amount,
             "minimum_amount": min_amount,
-            "top_5_mcc_codes": dict(sorted(mcc_distribution.items(), key=lambda x: x[1], reverse=True)[:5]),
-            "currency_distribution": currency_distribution
+            "top_5_mcc_codes": dict(mcc_distribution.most_common(5)),
+            "currency_distribution": dict(currency_distribution)
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_card_and_mcc", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_card_and_mcc(
+    request: Request,
     card_number: str = Query(..., description="Card number (supports partial matching)"),
     mcc: int = Query(..., description="Merchant Category Code (MCC)"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
     """Search transactions by card number AND MCC (optimized single query)"""
     try:
+        body = await fetch_json(request, SEARCH_BY_CARD_AND_MCC_SQL, f"%{like_escape(card_number)}%", mcc, clamp_limit(limit))
+        if body is not None:
+            return Response(body, media_type="application/json")
+
         params = {
-            'card_no': f"ilike.*{card_number}*",
+            'card_no': f"ilike.{like_pattern(card_number)}",
             'MCC': f"eq.{mcc}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_card_and_month", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_card_and_month(
+    request: Request,
     card_number: str = Query(..., description="Card number (supports partial matching)"),
     month: int = Query(..., description="Month (1-12)", ge=1, le=12),
     year: int = Query(..., description="Year (e.g., 2025)"),
@@ -310,18 +429,19 @@ async def search_transactions_by_card_and_month(
         date_pattern = f"*/{month_str}/{year}"
         
         params = {
-            'card_no': f"ilike.*{card_number}*",
+            'card_no': f"ilike.{like_pattern(card_number)}",
             'txn_date': f"like.{date_pattern}",
-            'limit': limit,
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_card_and_merchant", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_card_and_merchant(
+    request: Request,
     card_number: str = Query(..., description="Card number (supports partial matching)"),
     merchant: str = Query(..., description="Merchant name or particulars search"),
     limit: Optional[int] = Query(20, description="Limit results")
@@ -329,18 +449,19 @@ async def search_transactions_by_card_and_merchant(
     """Search transactions by card number AND merchant (optimized single query)"""
     try:
         params = {
-            'card_no': f"ilike.*{card_number}*",
-            'particulars': f"ilike.*{merchant}*",
-            'limit': limit,
+            'card_no': f"ilike.{like_pattern(card_number)}",
+            'particulars': f"ilike.{like_pattern(merchant)}",
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_card_and_date_range", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_card_and_date_range(
+    request: Request,
     card_number: str = Query(..., description="Card number (supports partial matching)"),
     from_date: str = Query(..., description="From date in DD/MM/YYYY format (e.g., 01/06/2025)"),
     to_date: str = Query(..., description="To date in DD/MM/YYYY format (e.g., 30/06/2025)"),
@@ -349,45 +470,54 @@ async def search_transactions_by_card_and_date_range(
     """Search transactions by card number AND date range (optimized with PostgREST filtering)"""
     try:
         # Validate date format
-        date_pattern = r'^\d{2}/\d{2}/\d{4}$'
-        if not re.match(date_pattern, from_date) or not re.match(date_pattern, to_date):
+        if not DATE_PATTERN.match(from_date) or not DATE_PATTERN.match(to_date):
             raise HTTPException(status_code=400, detail="Date format must be DD/MM/YYYY")
         
-        # First filter by card number, then handle date range in Python for accuracy
-        # Since PostgREST doesn't handle date range comparison well with DD/MM/YYYY text format
+        # Range filter and ordering on the indexed txn_date_iso field (sql/007_transaction_date_index.sql)
         params = {
-            'card_no': f"ilike.*{card_number}*",
-            'limit': 1000  # Get more records for date filtering
+            'card_no': f"ilike.{like_pattern(card_number)}",
+            'and': date_range_filter(from_date, to_date),
+            'order': 'txn_date_iso.desc',
+            'limit': clamp_limit(limit)
         }
+        response = await query_optional(request, "/transactions", params, key=TXN_DATE_ISO_KEY, raw=True)
+        if response is not None:
+            return response
         
-        data = await query_postgrest("/transactions", params)
+        # Fallback when the sql/ migrations are not applied: filter by card
+        # number, then handle the date range in Python
+        from_key = date_key(from_date)
+        to_key = date_key(to_date)
+        if from_key is None or to_key is None:
+            raise HTTPException(status_code=400, detail="Invalid date")
         
-        # Convert date strings to datetime objects for comparison
-        def parse_date(date_str):
-            try:
-                return datetime.strptime(date_str, "%d/%m/%Y")
-            except:
-                return None
+        params = {
+            'card_no': f"ilike.{like_pattern(card_number)}",
+            'limit': 1000  # Get more records for date filtering
+        }
+        months = month_filter(from_key, to_key)
+        if months:
+            params['or'] = months
         
-        from_dt = parse_date(from_date)
-        to_dt = parse_date(to_date)
+        data = await query_postgrest(request, "/transactions", params)
         
-        # Filter transactions within date range
-        filtered_data = []
-        for transaction in data:
-            txn_dt = parse_date(transaction.get('txn_date', ''))
-            if txn_dt and from_dt <= txn_dt <= to_dt:
-                filtered_data.append(transaction)
+        # Filter transactions within date range, keeping each row's date key for the sort
+        filtered_data = [
+            (txn_key, transaction) for transaction in data
+            if (txn_key := date_key(transaction.get('txn_date', ''))) and from_key <= txn_key <= to_key
+        ]
         
-        # Sort by date (newest first) and limit results
-        filtered_data.sort(key=lambda x: parse_date(x.get('txn_date', '')), reverse=True)
-        return filtered_data[:limit]
+        # Newest first, limited; nlargest only keeps `limit` rows instead of sorting them all
+        newest = heapq.nlargest(clamp_limit(limit), filtered_data, key=lambda x: x[0])
+        return [transaction for _, transaction in newest]
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_card_and_amount_range", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_card_and_amount_range(
+    request: Request,
     card_number: str = Query(..., description="Card number (supports partial matching)"),
     min_amount: Optional[float] = Query(None, description="Minimum transaction amount"),
     max_amount: Optional[float] = Query(None, description="Maximum transaction amount"),
@@ -396,27 +526,28 @@ async def search_transactions_by_card_and_amount_range(
     """Search transactions by card number AND amount range (optimized single query)"""
     try:
         params = {
-            'card_no': f"ilike.*{card_number}*",
-            'limit': limit,
+            'card_no': f"ilike.{like_pattern(card_number)}",
+            'limit': clamp_limit(limit),
             'order': 'source_amt.desc'
         }
         
-        # Add amount filters if provided
+        # Add amount filters if provided, both bounds in one and=(...) filter
+        bounds = []
         if min_amount is not None:
-            params['source_amt'] = f"gte.{min_amount}"
-        if max_amount is not None and min_amount is not None:
-            params['source_amt'] = f"gte.{min_amount}"
-            params['and'] = f"(source_amt.lte.{max_amount})"
-        elif max_amount is not None:
-            params['source_amt'] = f"lte.{max_amount}"
+            bounds.append(f"source_amt.gte.{min_amount}")
+        if max_amount is not None:
+            bounds.append(f"source_amt.lte.{max_amount}")
+        if bounds:
+            params['and'] = f"({','.join(bounds)})"
         
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search_by_card_advanced", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions_by_card_advanced(
+    request: Request,
     card_number: str = Query(..., description="Card number (supports partial matching)"),
     mcc: Optional[int] = Query(None, description="Optional MCC filter"),
     merchant: Optional[str] = Query(None, description="Optional merchant filter"),
@@ -427,9 +558,23 @@ async def search_transactions_by_card_advanced(
 ):
     """Advanced search by card number with multiple optional filters (optimized single query)"""
     try:
+        # One stored function for every filter combination (sql/010_transaction_advanced_search.sql)
+        rpc_params = {
+            'card': like_escape(card_number),
+            'limit': clamp_limit(limit),
+            'order': 'txn_date.desc'
+        }
+        filters = {'mcc': mcc, 'merchant': like_escape(merchant) if merchant else None, 'min_amount': min_amount, 'month': month, 'year': year}
+        rpc_params.update((name, value) for name, value in filters.items() if value is not None)
+        
+        response = await query_optional(request, "/rpc/search_card_advanced", rpc_params, raw=True)
+        if response is not None:
+            return response
+        
+        # Fallback when the sql/ migrations are not applied
         params = {
-            'card_no': f"ilike.*{card_number}*",
-            'limit': limit,
+            'card_no': f"ilike.{like_pattern(card_number)}",
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
         
@@ -438,7 +583,7 @@ async def search_transactions_by_card_advanced(
             params['MCC'] = f"eq.{mcc}"
         
         if merchant:
-            params['particulars'] = f"ilike.*{merchant}*"
+            params['particulars'] = f"ilike.{like_pattern(merchant)}"
         
         if min_amount is not None:
             params['source_amt'] = f"gte.{min_amount}"
@@ -448,30 +593,60 @@ async def search_transactions_by_card_advanced(
             date_pattern = f"*/{month_str}/{year}"
             params['txn_date'] = f"like.{date_pattern}"
         
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/search", response_model=List[Transaction])
+@cached(CACHE_TTL_SHORT)
 async def search_transactions(
-    q: str = Query(..., description="Search query - searches across card number, particulars, and ref number"),
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=MAX_SEARCH_LENGTH, description="Search query - searches across card number, particulars, and ref number"),
     limit: Optional[int] = Query(20, description="Limit results")
 ):
     """Generic search across transaction fields"""
     try:
         params = {
-            'or': f"(card_no.ilike.*{q}*,particulars.ilike.*{q}*,ref_no.ilike.*{q}*)",
-            'limit': limit,
+            'or': ilike_any(SEARCH_COLUMNS, q),
+            'limit': clamp_limit(limit),
             'order': 'txn_date.desc'
         }
-        data = await query_postgrest("/transactions", params)
-        return data
+        return await query_postgrest_raw(request, "/transactions", params)
+    except Exception as e:
+        raise http_error(e)
+
+@transactionRouter.post("/batch", response_model=List[List[Transaction]])
+async def batch_transactions(request: Request, queries: List[BatchQuery]):
+    """Run several transaction queries concurrently, results in request order"""
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(params: Dict[str, str]) -> bytes:
+        async with semaphore:
+            response = await query_postgrest_raw(request, "/transactions", params)
+            return response.body
+
+    # Identical queries in one batch share a single PostgREST call
+    unique = {}
+    keys = []
+    for query in queries:
+        params = {**query.params, 'limit': clamp_limit(query.limit)}
+        key = tuple(sorted(params.items()))
+        unique.setdefault(key, params)
+        keys.append(key)
+
+    try:
+        results = dict(zip(unique, await asyncio.gather(*(run(params) for params in unique.values()))))
+        # Each body is already a JSON array, so the results are joined as-is
+        return Response(b"[" + b",".join(results[key] for key in keys) + b"]", media_type="application/json")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/aggregate_by_mcc")
+@cached(CACHE_TTL_LONG)
 async def aggregate_transactions_by_mcc(
+    request: Request,
     mcc: int = Query(..., description="Merchant Category Code (MCC) to aggregate"),
     card_number: str = Query(..., description="Card number (supports partial matching)")
 ):
@@ -479,12 +654,13 @@ async def aggregate_transactions_by_mcc(
     try:
         # Filter by both MCC and card number
         params = {
+            'select': MERCHANT_AGGREGATE_COLUMNS,
             'MCC': f"eq.{mcc}",
-            'card_no': f"ilike.*{card_number}*"
+            'card_no': f"ilike.{like_pattern(card_number)}"
         }
         
         # Get all transactions for analysis
-        data = await query_postgrest("/transactions", params)
+        data = await query_postgrest(request, "/transactions", params)
         
         if not data:
             return {
@@ -495,19 +671,15 @@ async def aggregate_transactions_by_mcc(
             }
         
         # Calculate aggregations for the specific MCC and card combination
-        amounts = [transaction.get('source_amt', 0) for transaction in data if transaction.get('source_amt')]
-        reward_points = [transaction.get('reward_points', 0) for transaction in data]
+        amounts = [transaction['source_amt'] for transaction in data if transaction['source_amt']]
+        reward_points = [transaction['reward_points'] for transaction in data]
         
         # Get unique transaction dates for date range info
         transaction_dates = []
         for transaction in data:
-            txn_date = transaction.get('txn_date')
-            if txn_date:
-                try:
-                    parsed_date = datetime.strptime(txn_date, "%d/%m/%Y")
-                    transaction_dates.append(parsed_date)
-                except:
-                    continue
+            txn_date = transaction['txn_date']
+            if txn_date and (parsed_date := parse_txn_date(txn_date)):
+                transaction_dates.append(parsed_date)
         
         # Calculate date range
         date_range = None
@@ -517,10 +689,10 @@ async def aggregate_transactions_by_mcc(
             date_range = f"{earliest_date} to {latest_date}"
         
         # Get unique merchants/particulars
-        merchants = list(set([transaction.get('particulars', '') for transaction in data if transaction.get('particulars')]))
+        merchants = list(set([transaction['particulars'] for transaction in data if transaction['particulars']]))
         
         # Mask card number for privacy
-        masked_card = f"****-****-****-{card_number[-4:]}" if len(card_number) >= 4 else card_number
+        masked_card = mask_card(card_number)
         
         aggregation_result = {
             "mcc_code": mcc,
@@ -547,63 +719,81 @@ async def aggregate_transactions_by_mcc(
             "aggregation": aggregation_result
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/aggregate_by_card")
+@cached(CACHE_TTL_LONG)
 async def aggregate_transactions_by_card(
+    request: Request,
     mcc: Optional[int] = Query(None, description="Optional MCC filter"),
     min_transactions: Optional[int] = Query(1, description="Minimum number of transactions for inclusion")
 ):
     """Get transaction aggregations (sum, average, count) grouped by card number"""
     try:
-        params = {}
+        # Grouped in the database (sql/014_transaction_group_aggregates.sql)
+        rpc_params = {'min_transactions': min_transactions}
+        if mcc:
+            rpc_params['mcc'] = mcc
+        aggregations = await query_optional(request, "/rpc/transaction_card_aggregates", rpc_params)
+        if aggregations is not None:
+            return {
+                "aggregation_type": "by_card",
+                "total_cards": len(aggregations),
+                "filter_applied": f"mcc: {mcc}" if mcc else "none",
+                "aggregations": aggregations
+            }
+        
+        # Fallback when the sql/ migrations are not applied
+        params = {'select': AGGREGATE_COLUMNS}
         if mcc:
             params['MCC'] = f"eq.{mcc}"
         
         # Get all transactions for analysis
-        data = await query_postgrest("/transactions", params)
+        data = await query_postgrest(request, "/transactions", params)
         
         if not data:
             return {"message": "No transaction data found"}
         
         # Group by card number
-        card_aggregates = {}
+        card_aggregates = defaultdict(lambda: {
+            'min_amount': math.inf,
+            'max_amount': -math.inf,
+            'total_amount': 0,
+            'total_reward_points': 0,
+            'count': 0,
+            'mcc_codes': set()
+        })
         for transaction in data:
-            card_no = transaction.get('card_no')
-            amount = transaction.get('source_amt', 0)
-            reward_points = transaction.get('reward_points', 0)
+            card_no = transaction['card_no']
+            amount = transaction['source_amt']
+            reward_points = transaction['reward_points']
             
             if card_no and amount:
-                if card_no not in card_aggregates:
-                    card_aggregates[card_no] = {
-                        'transactions': [],
-                        'total_amount': 0,
-                        'total_reward_points': 0,
-                        'count': 0,
-                        'mcc_codes': set()
-                    }
-                
-                card_aggregates[card_no]['transactions'].append(amount)
-                card_aggregates[card_no]['total_amount'] += amount
-                card_aggregates[card_no]['total_reward_points'] += reward_points
-                card_aggregates[card_no]['count'] += 1
-                if transaction.get('MCC'):
-                    card_aggregates[card_no]['mcc_codes'].add(transaction.get('MCC'))
+                group = card_aggregates[card_no]
+                if amount < group['min_amount']:
+                    group['min_amount'] = amount
+                if amount > group['max_amount']:
+                    group['max_amount'] = amount
+                group['total_amount'] += amount
+                group['total_reward_points'] += reward_points
+                group['count'] += 1
+                if mcc_code := transaction['MCC']:
+                    group['mcc_codes'].add(mcc_code)
         
         # Calculate final aggregations
         result = {}
         for card_no, data in card_aggregates.items():
             if data['count'] >= min_transactions:
                 # Mask card number for privacy (show only last 4 digits)
-                masked_card = f"****-****-****-{card_no[-4:]}" if len(card_no) >= 4 else card_no
+                masked_card = mask_card(card_no)
                 
                 result[card_no] = {
                     'card_number_masked': masked_card,
                     'transaction_count': data['count'],
                     'total_amount': round(data['total_amount'], 2),
                     'average_amount': round(data['total_amount'] / data['count'], 2),
-                    'min_amount': round(min(data['transactions']), 2),
-                    'max_amount': round(max(data['transactions']), 2),
+                    'min_amount': round(data['min_amount'], 2),
+                    'max_amount': round(data['max_amount'], 2),
                     'total_reward_points': data['total_reward_points'],
                     'average_reward_points': round(data['total_reward_points'] / data['count'], 2),
                     'unique_mcc_codes': len(data['mcc_codes']),
@@ -620,70 +810,87 @@ async def aggregate_transactions_by_card(
             "aggregations": sorted_result
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/aggregate_by_month")
+@cached(CACHE_TTL_LONG)
 async def aggregate_transactions_by_month(
+    request: Request,
     year: Optional[int] = Query(None, description="Filter by specific year (e.g., 2025)"),
     card_number: Optional[str] = Query(None, description="Optional card number filter"),
     min_transactions: Optional[int] = Query(1, description="Minimum number of transactions for inclusion")
 ):
     """Get transaction aggregations (sum, average, count) grouped by month/year"""
     try:
-        params = {}
+        # Grouped in the database (sql/014_transaction_group_aggregates.sql)
+        rpc_params = {'min_transactions': min_transactions}
+        if card_number:
+            rpc_params['card'] = like_escape(card_number)
+        if year:
+            rpc_params['year'] = year
+        aggregations = await query_optional(request, "/rpc/transaction_month_aggregates", rpc_params)
+        if aggregations is not None:
+            return {
+                "aggregation_type": "by_month",
+                "total_months": len(aggregations),
+                "filter_applied": {
+                    "year": year,
+                    "card_number": card_number
+                },
+                "aggregations": aggregations
+            }
+        
+        # Fallback when the sql/ migrations are not applied
+        params = {'select': AGGREGATE_COLUMNS}
         if card_number:
-            params['card_no'] = f"ilike.*{card_number}*"
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
         
         # Get all transactions for analysis
-        data = await query_postgrest("/transactions", params)
+        data = await query_postgrest(request, "/transactions", params)
         
         if not data:
             return {"message": "No transaction data found"}
         
-        # Helper function to parse dates
-        def parse_date(date_str):
-            try:
-                return datetime.strptime(date_str, "%d/%m/%Y")
-            except:
-                return None
-        
         # Group by month/year
         month_aggregates = {}
         for transaction in data:
-            txn_date = transaction.get('txn_date')
-            amount = transaction.get('source_amt', 0)
-            reward_points = transaction.get('reward_points', 0)
+            txn_date = transaction['txn_date']
+            amount = transaction['source_amt']
+            reward_points = transaction['reward_points']
             
             if txn_date and amount:
-                parsed_date = parse_date(txn_date)
+                parsed_date = parse_txn_date(txn_date)
                 if parsed_date:
                     # Filter by year if specified
                     if year and parsed_date.year != year:
                         continue
                     
                     month_key = f"{parsed_date.year}-{parsed_date.month:02d}"
-                    month_name = parsed_date.strftime("%B %Y")
                     
-                    if month_key not in month_aggregates:
-                        month_aggregates[month_key] = {
-                            'month_name': month_name,
+                    group = month_aggregates.get(month_key)
+                    if group is None:
+                        group = month_aggregates[month_key] = {
+                            'month_name': parsed_date.strftime("%B %Y"),
                             'year': parsed_date.year,
                             'month': parsed_date.month,
-                            'transactions': [],
+                            'min_amount': math.inf,
+                            'max_amount': -math.inf,
                             'total_amount': 0,
                             'total_reward_points': 0,
                             'count': 0,
                             'unique_cards': set(),
                             'unique_mcc_codes': set()
                         }
-                    
-                    month_aggregates[month_key]['transactions'].append(amount)
-                    month_aggregates[month_key]['total_amount'] += amount
-                    month_aggregates[month_key]['total_reward_points'] += reward_points
-                    month_aggregates[month_key]['count'] += 1
-                    month_aggregates[month_key]['unique_cards'].add(transaction.get('card_no'))
-                    if transaction.get('MCC'):
-                        month_aggregates[month_key]['unique_mcc_codes'].add(transaction.get('MCC'))
+                    if amount < group['min_amount']:
+                        group['min_amount'] = amount
+                    if amount > group['max_amount']:
+                        group['max_amount'] = amount
+                    group['total_amount'] += amount
+                    group['total_reward_points'] += reward_points
+                    group['count'] += 1
+                    group['unique_cards'].add(transaction['card_no'])
+                    if mcc_code := transaction['MCC']:
+                        group['unique_mcc_codes'].add(mcc_code)
         
         # Calculate final aggregations
         result = {}
@@ -696,8 +903,8 @@ async def aggregate_transactions_by_month(
                     'transaction_count': data['count'],
                     'total_amount': round(data['total_amount'], 2),
                     'average_amount': round(data['total_amount'] / data['count'], 2),
-                    'min_amount': round(min(data['transactions']), 2),
-                    'max_amount': round(max(data['transactions']), 2),
+                    'min_amount': round(data['min_amount'], 2),
+                    'max_amount': round(data['max_amount'], 2),
                     'total_reward_points': data['total_reward_points'],
                     'average_reward_points': round(data['total_reward_points'] / data['count'], 2),
                     'unique_cards': len(data['unique_cards']),
@@ -717,10 +924,12 @@ async def aggregate_transactions_by_month(
             "aggregations": sorted_result
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/aggregate_by_date_range")
+@cached(CACHE_TTL_LONG)
 async def aggregate_transactions_by_date_range(
+    request: Request,
     from_date: str = Query(..., description="From date in DD/MM/YYYY format"),
     to_date: str = Query(..., description="To date in DD/MM/YYYY format"),
     card_number: Optional[str] = Query(None, description="Optional card number filter"),
@@ -730,38 +939,58 @@ async def aggregate_transactions_by_date_range(
     """Get transaction aggregations for a specific date range with optional grouping"""
     try:
         # Validate date format
-        date_pattern = r'^\d{2}/\d{2}/\d{4}$'
-        if not re.match(date_pattern, from_date) or not re.match(date_pattern, to_date):
+        if not DATE_PATTERN.match(from_date) or not DATE_PATTERN.match(to_date):
             raise HTTPException(status_code=400, detail="Date format must be DD/MM/YYYY")
         
-        params = {}
+        # Aggregated in the database (sql/016_transaction_date_range_aggregates.sql)
+        rpc_params = {'from_date': iso_date(from_date), 'to_date': iso_date(to_date)}
+        if card_number:
+            rpc_params['card'] = like_escape(card_number)
+        if mcc:
+            rpc_params['mcc'] = mcc
+        if group_by_days:
+            rpc_params['group_by_days'] = group_by_days
+        aggregations = await query_optional(request, "/rpc/transaction_date_range_aggregates", rpc_params)
+        if aggregations is not None:
+            if not aggregations:
+                return {"message": "No transactions found in the specified date range"}
+            return {
+                "aggregation_type": "by_date_range",
+                "date_range": f"{from_date} to {to_date}",
+                "group_by_days": group_by_days,
+                "filter_applied": {
+                    "card_number": card_number,
+                    "mcc": mcc
+                },
+                "aggregations": aggregations
+            }
+        
+        params = {'select': AGGREGATE_COLUMNS}
         if card_number:
-            params['card_no'] = f"ilike.*{card_number}*"
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
         if mcc:
             params['MCC'] = f"eq.{mcc}"
         
-        # Get all transactions for analysis
-        data = await query_postgrest("/transactions", params)
+        # Fallback when the sql/ migrations are not applied. Only fetch rows inside the range, filtered on txn_date_iso (sql/007_transaction_date_index.sql)
+        in_range = await query_optional(request, "/transactions", dict(params, **{'and': date_range_filter(from_date, to_date)}), key=TXN_DATE_ISO_KEY)
+        if in_range is not None and not in_range:
+            return {"message": "No transactions found in the specified date range"}
+        
+        # Fallback when the sql/ migrations are not applied: get all transactions for analysis
+        data = in_range if in_range is not None else await query_postgrest(request, "/transactions", params)
         
         if not data:
             return {"message": "No transaction data found"}
         
-        # Helper function to parse dates
-        def parse_date(date_str):
-            try:
-                return datetime.strptime(date_str, "%d/%m/%Y")
-            except:
-                return None
+        from_dt = parse_txn_date(from_date)
+        to_dt = parse_txn_date(to_date)
         
-        from_dt = parse_date(from_date)
-        to_dt = parse_date(to_date)
-        
-        # Filter transactions within date range
+        # Filter transactions within date range, keeping each parsed date for the grouping below
         filtered_transactions = []
         for transaction in data:
-            txn_dt = parse_date(transaction.get('txn_date', ''))
+            txn_dt = parse_txn_date(transaction['txn_date'])
             if txn_dt and from_dt <= txn_dt <= to_dt:
-                filtered_transactions.append(transaction)
+                filtered_transactions.append((txn_dt, transaction))
         
         if not filtered_transactions:
             return {"message": "No transactions found in the specified date range"}
@@ -770,38 +999,40 @@ async def aggregate_transactions_by_date_range(
         if group_by_days:
             # Group by specified day intervals
             groups = {}
-            for transaction in filtered_transactions:
-                txn_dt = parse_date(transaction.get('txn_date', ''))
-                if txn_dt:
-                    days_from_start = (txn_dt - from_dt).days
-                    group_number = days_from_start // group_by_days
+            for txn_dt, transaction in filtered_transactions:
+                days_from_start = (txn_dt - from_dt).days
+                group_number = days_from_start // group_by_days
+                group_key = f"Group_{group_number + 1}"
+                
+                group = groups.get(group_key)
+                if group is None:
+                    # The period's dates are only formatted once, when it is first seen
                     group_start = from_dt + timedelta(days=group_number * group_by_days)
                     group_end = min(group_start + timedelta(days=group_by_days - 1), to_dt)
-                    
-                    group_key = f"Group_{group_number + 1}"
-                    group_range = f"{group_start.strftime('%d/%m/%Y')} to {group_end.strftime('%d/%m/%Y')}"
-                    
-                    if group_key not in groups:
-                        groups[group_key] = {
-                            'date_range': group_range,
-                            'transactions': [],
-                            'total_amount': 0,
-                            'total_reward_points': 0,
-                            'count': 0,
-                            'unique_cards': set(),
-                            'unique_mcc_codes': set()
-                        }
-                    
-                    amount = transaction.get('source_amt', 0)
-                    reward_points = transaction.get('reward_points', 0)
-                    
-                    groups[group_key]['transactions'].append(amount)
-                    groups[group_key]['total_amount'] += amount
-                    groups[group_key]['total_reward_points'] += reward_points
-                    groups[group_key]['count'] += 1
-                    groups[group_key]['unique_cards'].add(transaction.get('card_no'))
-                    if transaction.get('MCC'):
-                        groups[group_key]['unique_mcc_codes'].add(transaction.get('MCC'))
+                    group = groups[group_key] = {
+                        'date_range': f"{group_start.strftime('%d/%m/%Y')} to {group_end.strftime('%d/%m/%Y')}",
+                        'min_amount': math.inf,
+                        'max_amount': -math.inf,
+                        'total_amount': 0,
+                        'total_reward_points': 0,
+                        'count': 0,
+                        'unique_cards': set(),
+                        'unique_mcc_codes': set()
+                    }
+                
+                amount = transaction['source_amt']
+                reward_points = transaction['reward_points']
+                
+                if amount < group['min_amount']:
+                    group['min_amount'] = amount
+                if amount > group['max_amount']:
+                    group['max_amount'] = amount
+                group['total_amount'] += amount
+                group['total_reward_points'] += reward_points
+                group['count'] += 1
+                group['unique_cards'].add(transaction['card_no'])
+                if transaction['MCC']:
+                    group['unique_mcc_codes'].add(transaction['MCC'])
             
             # Calculate aggregations for groups
             result = {}
@@ -811,8 +1042,8 @@ async def aggregate_transactions_by_date_range(
                     'transaction_count': data['count'],
                     'total_amount': round(data['total_amount'], 2),
                     'average_amount': round(data['total_amount'] / data['count'], 2),
-                    'min_amount': round(min(data['transactions']), 2),
-                    'max_amount': round(max(data['transactions']), 2),
+                    'min_amount': round(data['min_amount'], 2),
+                    'max_amount': round(data['max_amount'], 2),
                     'total_reward_points': data['total_reward_points'],
                     'average_reward_points': round(data['total_reward_points'] / data['count'], 2),
                     'unique_cards': len(data['unique_cards']),
@@ -820,10 +1051,10 @@ async def aggregate_transactions_by_date_range(
                 }
         else:
             # Single aggregation for entire date range
-            amounts = [t.get('source_amt', 0) for t in filtered_transactions if t.get('source_amt')]
-            reward_points = [t.get('reward_points', 0) for t in filtered_transactions]
-            unique_cards = set([t.get('card_no') for t in filtered_transactions if t.get('card_no')])
-            unique_mccs = set([t.get('MCC') for t in filtered_transactions if t.get('MCC')])
+            amounts = [t['source_amt'] for _, t in filtered_transactions if t['source_amt']]
+            reward_points = [t['reward_points'] for _, t in filtered_transactions]
+            unique_cards = set([t['card_no'] for _, t in filtered_transactions if t['card_no']])
+            unique_mccs = set([t['MCC'] for _, t in filtered_transactions if t['MCC']])
             
             result = {
                 'overall': {
@@ -851,10 +1082,12 @@ async def aggregate_transactions_by_date_range(
             "aggregations": result
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/aggregate_comprehensive")
+@cached(CACHE_TTL_LONG)
 async def aggregate_transactions_comprehensive(
+    request: Request,
     card_number: Optional[str] = Query(None, description="Optional card number filter"),
     mcc: Optional[int] = Query(None, description="Optional MCC filter"),
     month: Optional[int] = Query(None, description="Optional month filter (1-12)", ge=1, le=12),
@@ -864,25 +1097,40 @@ async def aggregate_transactions_comprehensive(
 ):
     """Get comprehensive transaction aggregations with multiple groupings and insights"""
     try:
-        params = {}
+        # Aggregated in the database (sql/017_transaction_comprehensive.sql)
+        filters = {'card': like_escape(card_number) if card_number else None, 'mcc': mcc, 'month': month, 'year': year, 'min_amount': min_amount}
+        rpc_params = {name: value for name, value in filters.items() if value}
+        if top_n is not None:
+            rpc_params['top_n'] = max(top_n, 0)
+        aggregations = await query_optional(request, "/rpc/transaction_comprehensive", rpc_params)
+        if aggregations is not None:
+            if not aggregations:
+                return {"message": "No transactions found matching the criteria" if month or year or min_amount else "No transaction data found"}
+            return {
+                "aggregation_type": "comprehensive",
+                "filters_applied": {
+                    "card_number": card_number,
+                    "mcc": mcc,
+                    "month": month,
+                    "year": year,
+                    "min_amount": min_amount
+                },
+                **aggregations
+            }
+        
+        # Fallback when the sql/ migrations are not applied
+        params = {'select': AGGREGATE_COLUMNS}
         if card_number:
-            params['card_no'] = f"ilike.*{card_number}*"
+            params['card_no'] = f"ilike.{like_pattern(card_number)}"
         if mcc:
             params['MCC'] = f"eq.{mcc}"
         
         # Get all transactions for analysis
-        data = await query_postgrest("/transactions", params)
+        data = await query_postgrest(request, "/transactions", params)
         
         if not data:
             return {"message": "No transaction data found"}
         
-        # Helper function to parse dates
-        def parse_date(date_str):
-            try:
-                return datetime.strptime(date_str, "%d/%m/%Y")
-            except:
-                return None
-        
         # Filter by additional criteria
         filtered_transactions = []
         for transaction in data:
@@ -890,7 +1138,7 @@ async def aggregate_transactions_comprehensive(
             
             # Date filters
             if month or year:
-                txn_dt = parse_date(transaction.get('txn_date', ''))
+                txn_dt = parse_txn_date(transaction['txn_date'])
                 if txn_dt:
                     if month and txn_dt.month != month:
                         include = False
@@ -900,7 +1148,7 @@ async def aggregate_transactions_comprehensive(
                     include = False
             
             # Amount filter
-            if min_amount and transaction.get('source_amt', 0) < min_amount:
+            if min_amount and transaction['source_amt'] < min_amount:
                 include = False
             
             if include:
@@ -910,8 +1158,8 @@ async def aggregate_transactions_comprehensive(
             return {"message": "No transactions found matching the criteria"}
         
         # Overall statistics
-        amounts = [t.get('source_amt', 0) for t in filtered_transactions if t.get('source_amt')]
-        reward_points = [t.get('reward_points', 0) for t in filtered_transactions]
+        amounts = [t['source_amt'] for t in filtered_transactions if t['source_amt']]
+        reward_points = [t['reward_points'] for t in filtered_transactions]
         
         overall_stats = {
             'total_transactions': len(filtered_transactions),
@@ -924,54 +1172,54 @@ async def aggregate_transactions_comprehensive(
         }
         
         # Group by MCC
-        mcc_groups = {}
-        card_groups = {}
+        mcc_groups = defaultdict(lambda: {'amount': 0, 'count': 0, 'reward_points': 0})
+        card_groups = defaultdict(lambda: {'amount': 0, 'count': 0, 'reward_points': 0})
         month_groups = {}
         
         for transaction in filtered_transactions:
+            amount = transaction['source_amt']
+            reward_points = transaction['reward_points']
+            
             # MCC grouping
-            mcc_code = transaction.get('MCC')
-            if mcc_code:
-                if mcc_code not in mcc_groups:
-                    mcc_groups[mcc_code] = {'amount': 0, 'count': 0, 'reward_points': 0}
-                mcc_groups[mcc_code]['amount'] += transaction.get('source_amt', 0)
-                mcc_groups[mcc_code]['count'] += 1
-                mcc_groups[mcc_code]['reward_points'] += transaction.get('reward_points', 0)
+            if mcc_code := transaction['MCC']:
+                group = mcc_groups[mcc_code]
+                group['amount'] += amount
+                group['count'] += 1
+                group['reward_points'] += reward_points
             
             # Card grouping
-            card_no = transaction.get('card_no')
-            if card_no:
-                if card_no not in card_groups:
-                    card_groups[card_no] = {'amount': 0, 'count': 0, 'reward_points': 0}
-                card_groups[card_no]['amount'] += transaction.get('source_amt', 0)
-                card_groups[card_no]['count'] += 1
-                card_groups[card_no]['reward_points'] += transaction.get('reward_points', 0)
+            if card_no := transaction['card_no']:
+                group = card_groups[card_no]
+                group['amount'] += amount
+                group['count'] += 1
+                group['reward_points'] += reward_points
             
             # Month grouping
-            txn_dt = parse_date(transaction.get('txn_date', ''))
+            txn_dt = parse_txn_date(transaction['txn_date'])
             if txn_dt:
                 month_key = f"{txn_dt.year}-{txn_dt.month:02d}"
-                if month_key not in month_groups:
-                    month_groups[month_key] = {'amount': 0, 'count': 0, 'reward_points': 0, 'month_name': txn_dt.strftime('%B %Y')}
-                month_groups[month_key]['amount'] += transaction.get('source_amt', 0)
-                month_groups[month_key]['count'] += 1
-                month_groups[month_key]['reward_points'] += transaction.get('reward_points', 0)
+                group = month_groups.get(month_key)
+                if group is None:
+                    group = month_groups[month_key] = {'amount': 0, 'count': 0, 'reward_points': 0, 'month_name': txn_dt.strftime('%B %Y')}
+                group['amount'] += amount
+                group['count'] += 1
+                group['reward_points'] += reward_points
         
         # Top MCCs by amount
-        top_mccs = dict(sorted(mcc_groups.items(), key=lambda x: x[1]['amount'], reverse=True)[:top_n])
+        top_mccs = top_groups(mcc_groups, top_n)
         for mcc, data in top_mccs.items():
             data['average_amount'] = round(data['amount'] / data['count'], 2)
             data['total_amount'] = round(data['amount'], 2)
         
         # Top cards by amount
-        top_cards = dict(sorted(card_groups.items(), key=lambda x: x[1]['amount'], reverse=True)[:top_n])
+        top_cards = top_groups(card_groups, top_n)
         for card, data in top_cards.items():
             data['average_amount'] = round(data['amount'] / data['count'], 2)
             data['total_amount'] = round(data['amount'], 2)
-            data['card_masked'] = f"****-****-****-{card[-4:]}" if len(card) >= 4 else card
+            data['card_masked'] = mask_card(card)
         
         # Top months by amount
-        top_months = dict(sorted(month_groups.items(), key=lambda x: x[1]['amount'], reverse=True)[:top_n])
+        top_months = top_groups(month_groups, top_n)
         for month_key, data in top_months.items():
             data['average_amount'] = round(data['amount'] / data['count'], 2)
             data['total_amount'] = round(data['amount'], 2)
@@ -996,10 +1244,12 @@ async def aggregate_transactions_comprehensive(
             }
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @transactionRouter.get("/aggregate_by_card_and_mcc_array")
+@cached(CACHE_TTL_LONG)
 async def aggregate_transactions_by_card_and_mcc_array(
+    request: Request,
     card_number: str = Query(..., description="Card number (supports partial matching)"),
     mcc_codes: List[int] = Query(..., description="Array of MCC codes to aggregate (e.g., [5411,5812,4111])")
 ):
@@ -1009,57 +1259,56 @@ async def aggregate_transactions_by_card_and_mcc_array(
         if not mcc_codes:
             raise HTTPException(status_code=400, detail="At least one MCC code must be provided")
         
-        # Get all transactions for the card number first
+        # Only fetch the card's transactions with the specified MCC codes
+        card_filter = f"ilike.{like_pattern(card_number)}"
         params = {
-            'card_no': f"ilike.*{card_number}*"
+            'select': MERCHANT_AGGREGATE_COLUMNS,
+            'card_no': card_filter,
+            'MCC': f"in.({','.join(map(str, mcc_codes))})"
         }
         
-        data = await query_postgrest("/transactions", params)
-        
-        if not data:
-            return {
-                "message": "No transaction data found",
-                "card_number_filter": card_number,
-                "mcc_codes_filter": mcc_codes,
-                "details": "No transactions found for this card number"
-            }
-        
-        # Filter transactions by the specified MCC codes
-        filtered_transactions = []
-        for transaction in data:
-            transaction_mcc = transaction.get('MCC')
-            if transaction_mcc and transaction_mcc in mcc_codes:
-                filtered_transactions.append(transaction)
+        data = await query_postgrest(request, "/transactions", params)
+        filtered_transactions = [transaction for transaction in data if transaction['MCC']]
         
         if not filtered_transactions:
+            # Count the card's other transactions only to explain the empty result
+            total_for_card = await count_rows(request, "/transactions", {'card_no': card_filter})
+            if not total_for_card:
+                return {
+                    "message": "No transaction data found",
+                    "card_number_filter": card_number,
+                    "mcc_codes_filter": mcc_codes,
+                    "details": "No transactions found for this card number"
+                }
             return {
                 "message": "No transactions found for the specified MCC codes",
                 "card_number_filter": card_number,
                 "mcc_codes_filter": mcc_codes,
-                "total_transactions_for_card": len(data),
+                "total_transactions_for_card": total_for_card,
                 "details": "Card has transactions but none match the specified MCC codes"
             }
         
-        # Helper function to parse dates
-        def parse_date(date_str):
-            try:
-                return datetime.strptime(date_str, "%d/%m/%Y")
-            except:
-                return None
-        
         # Group transactions by MCC code
-        mcc_aggregates = {}
+        mcc_aggregates = defaultdict(lambda: {
+            'min_amount': math.inf,
+            'max_amount': -math.inf,
+            'total_amount': 0,
+            'total_reward_points': 0,
+            'count': 0,
+            'merchants': set(),
+            'dates': []
+        })
         overall_amounts = []
         overall_reward_points = []
         transaction_dates = []
         unique_merchants = set()
         
         for transaction in filtered_transactions:
-            mcc = transaction.get('MCC')
-            amount = transaction.get('source_amt', 0)
-            reward_points = transaction.get('reward_points', 0)
-            txn_date = transaction.get('txn_date')
-            particulars = transaction.get('particulars', '')
+            mcc = transaction['MCC']
+            amount = transaction['source_amt']
+            reward_points = transaction['reward_points']
+            txn_date = transaction['txn_date']
+            particulars = transaction['particulars']
             
             # Collect overall data
             if amount:
@@ -1070,31 +1319,24 @@ async def aggregate_transactions_by_card_and_mcc_array(
                 unique_merchants.add(particulars)
             
             # Parse and collect transaction dates
-            if txn_date:
-                parsed_date = parse_date(txn_date)
-                if parsed_date:
-                    transaction_dates.append(parsed_date)
+            parsed_date = parse_txn_date(txn_date) if txn_date else None
+            if parsed_date:
+                transaction_dates.append(parsed_date)
             
             # Group by MCC
             if mcc and amount:
-                if mcc not in mcc_aggregates:
-                    mcc_aggregates[mcc] = {
-                        'transactions': [],
-                        'total_amount': 0,
-                        'total_reward_points': 0,
-                        'count': 0,
-                        'merchants': set(),
-                        'dates': []
-                    }
-                
-                mcc_aggregates[mcc]['transactions'].append(amount)
-                mcc_aggregates[mcc]['total_amount'] += amount
-                mcc_aggregates[mcc]['total_reward_points'] += reward_points
-                mcc_aggregates[mcc]['count'] += 1
+                group = mcc_aggregates[mcc]
+                if amount < group['min_amount']:
+                    group['min_amount'] = amount
+                if amount > group['max_amount']:
+                    group['max_amount'] = amount
+                group['total_amount'] += amount
+                group['total_reward_points'] += reward_points
+                group['count'] += 1
                 if particulars:
-                    mcc_aggregates[mcc]['merchants'].add(particulars)
+                    group['merchants'].add(particulars)
                 if parsed_date:
-                    mcc_aggregates[mcc]['dates'].append(parsed_date)
+                    group['dates'].append(parsed_date)
         
         # Calculate date range
         date_range = None
@@ -1103,9 +1345,15 @@ async def aggregate_transactions_by_card_and_mcc_array(
             latest_date = max(transaction_dates).strftime("%d/%m/%Y")
             date_range = f"{earliest_date} to {latest_date}"
         
-        # Calculate individual MCC aggregations
+        # Summed once; every MCC's percentage of the total divides by it
+        overall_total = sum(overall_amounts)
+        
+        # Calculate individual MCC aggregations, tracking the top spending MCC on the way
         mcc_results = {}
+        best_mcc, best_amount = None, -math.inf
         for mcc, data in mcc_aggregates.items():
+            if data['total_amount'] > best_amount:
+                best_mcc, best_amount = mcc, data['total_amount']
             mcc_date_range = None
             if data['dates']:
                 earliest = min(data['dates']).strftime("%d/%m/%Y")
@@ -1117,21 +1365,21 @@ async def aggregate_transactions_by_card_and_mcc_array(
                 'transaction_count': data['count'],
                 'total_amount': round(data['total_amount'], 2),
                 'average_amount': round(data['total_amount'] / data['count'], 2),
-                'min_amount': round(min(data['transactions']), 2),
-                'max_amount': round(max(data['transactions']), 2),
+                'min_amount': round(data['min_amount'], 2),
+                'max_amount': round(data['max_amount'], 2),
                 'total_reward_points': data['total_reward_points'],
                 'average_reward_points': round(data['total_reward_points'] / data['count'], 2),
                 'unique_merchants': len(data['merchants']),
                 'top_merchants': list(data['merchants'])[:5],
                 'date_range': mcc_date_range,
-                'percentage_of_total': round((data['total_amount'] / sum(overall_amounts)) * 100, 2) if overall_amounts else 0
+                'percentage_of_total': round((data['total_amount'] / overall_total) * 100, 2) if overall_amounts else 0
             }
         
         # Sort MCC results by total amount descending
         sorted_mcc_results = dict(sorted(mcc_results.items(), key=lambda x: x[1]['total_amount'], reverse=True))
         
         # Overall aggregations
-        masked_card = f"****-****-****-{card_number[-4:]}" if len(card_number) >= 4 else card_number
+        masked_card = mask_card(card_number)
         
         overall_aggregation = {
             'card_number_masked': masked_card,
@@ -1140,8 +1388,8 @@ async def aggregate_transactions_by_card_and_mcc_array(
             'mcc_codes_found': sorted(list(mcc_aggregates.keys())),
             'missing_mcc_codes': sorted([mcc for mcc in mcc_codes if mcc not in mcc_aggregates]),
             'total_transactions': len(filtered_transactions),
-            'total_amount': round(sum(overall_amounts), 2) if overall_amounts else 0,
-            'average_amount': round(sum(overall_amounts) / len(overall_amounts), 2) if overall_amounts else 0,
+            'total_amount': round(overall_total, 2) if overall_amounts else 0,
+            'average_amount': round(overall_total / len(overall_amounts), 2) if overall_amounts else 0,
             'min_amount': round(min(overall_amounts), 2) if overall_amounts else 0,
             'max_amount': round(max(overall_amounts), 2) if overall_amounts else 0,
             'total_reward_points': sum(overall_reward_points),
@@ -1153,7 +1401,7 @@ async def aggregate_transactions_by_card_and_mcc_array(
         
         # Calculate distribution percentages
         mcc_distribution = {}
-        total_amount = sum(overall_amounts) if overall_amounts else 1
+        total_amount = overall_total if overall_amounts else 1
         for mcc, data in mcc_aggregates.items():
             mcc_distribution[str(mcc)] = {
                 'mcc_code': mcc,
@@ -1175,8 +1423,8 @@ async def aggregate_transactions_by_card_and_mcc_array(
                 "total_mcc_codes_requested": len(mcc_codes),
                 "mcc_codes_with_transactions": len(mcc_aggregates),
                 "coverage_percentage": round((len(mcc_aggregates) / len(mcc_codes)) * 100, 2),
-                "top_spending_mcc": max(mcc_aggregates.keys(), key=lambda x: mcc_aggregates[x]['total_amount']) if mcc_aggregates else None
+                "top_spending_mcc": best_mcc
             }
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise http_error(e) 
\ No newline at end of file
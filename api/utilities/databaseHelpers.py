@@ -0,0 +1,32 @@
+from fastapi import Request
+import asyncio
+import asyncpg
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Queries that failed because the sql/ migrations are not applied
+_missing_queries = set()
+
+async def fetch_json(request: Request, query: str, *args):
+    """Run a query returning one JSON value directly on Postgres.
+
+    Returns None when no DATABASE_URL pool is configured, the query depends
+    on missing sql/ migrations, or Postgres or the pool fails, so callers can
+    fall back to PostgREST and get its response (or its 4xx) instead.
+    """
+    pool = request.app.state.db
+    if pool is None or query in _missing_queries:
+        return None
+    try:
+        async with pool.acquire() as connection:
+            return await connection.fetchval(query, *args)
+    except (asyncpg.UndefinedFunctionError, asyncpg.UndefinedTableError, asyncpg.UndefinedColumnError) as e:
+        logger.warning("Direct query unavailable, using PostgREST: %s", e)
+        _missing_queries.add(query)
+        return None
+    except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError) as e:
+        # Connection and pool failures, or arguments Postgres rejects such as a
+        # negative LIMIT; only this call falls back, the query stays enabled
+        logger.warning("Direct query failed, using PostgREST: %s", e)
+        return None
@@ -0,0 +1,11 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+import time
+
+@lru_cache(maxsize=64)
+def _date_str(minute_bucket: int, fmt: str, days_ahead: int) -> str:
+    return (datetime.now() + timedelta(days=days_ahead)).strftime(fmt)
+
+def date_str(fmt: str, days_ahead: int = 0) -> str:
+    """Format today's date (plus `days_ahead` days), recomputed at most once a minute"""
+    return _date_str(int(time.time() // 60), fmt, days_ahead)
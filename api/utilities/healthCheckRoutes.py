@@ -1,26 +1,22 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from datetime import datetime
-import httpx
-import os
+from api.utilities.postgrestHelpers import query_postgrest
+from api.utilities.requestMetrics import metrics_snapshot
 
 # Create API Router for health checks
 healthCheckRouter = APIRouter()
 
-# Helper function to make PostgREST requests (for health check)
-async def query_postgrest(endpoint: str, params: dict = None):
-    """Query PostgREST endpoint"""
-    POSTGREST_URL = os.getenv("POSTGREST_URL")
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{POSTGREST_URL}{endpoint}", params=params)
-        response.raise_for_status()
-        return response.json()
-
 @healthCheckRouter.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """Health check endpoint"""
     try:
         # Test PostgREST connection
-        await query_postgrest("/bob_credit_card_types", {"limit": 1})
+        await query_postgrest(request, "/bob_credit_card_types", {"limit": 1})
         return {"status": "healthy", "timestamp": datetime.now().isoformat()}
     except Exception as e:
-        return {"status": "unhealthy", "error": str(e), "timestamp": datetime.now().isoformat()} 
\ No newline at end of file
+        return {"status": "unhealthy", "error": str(e), "timestamp": datetime.now().isoformat()}
+
+@healthCheckRouter.get("/metrics")
+async def request_metrics():
+    """Request counts and latencies per route for this worker, slowest total time first"""
+    return {"routes": metrics_snapshot(), "timestamp": datetime.now().isoformat()}
@@ -0,0 +1,142 @@
+from fastapi import HTTPException, Request, Response
+from functools import lru_cache
+from urllib.parse import urlencode
+import httpx
+import orjson
+
+# PostgREST / Postgres error codes meaning the queried function, table or
+# column does not exist (i.e. the sql/ migrations have not been applied)
+MISSING_OBJECT_CODES = {"PGRST200", "PGRST202", "PGRST205", "42P01", "42703", "42883"}
+
+# Row limits applied to list endpoints so no request can pull a whole table
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Longest free-text search string accepted by the search endpoints
+MAX_SEARCH_LENGTH = 100
+
+# PostgREST client errors that mean the upstream credentials are wrong, which
+# is a server fault, not something the API client can fix
+UPSTREAM_AUTH_ERRORS = (401, 403, 407)
+
+# PostgREST response headers passed through to clients on raw responses
+FORWARDED_HEADERS = ("Content-Range",)
+
+# Database objects found missing in this process, so they are not retried per request
+_missing_objects = set()
+
+def _url(endpoint: str, params: dict = None) -> str:
+    # Encoding the query string with urlencode is cheaper than httpx building
+    # QueryParams from a dict, and yields the same URL (None is sent as empty)
+    if not params:
+        return endpoint
+    return endpoint + "?" + urlencode([(name, "" if value is None else value) for name, value in params.items()])
+
+# Helper function to make PostgREST requests
+async def query_postgrest(request: Request, endpoint: str, params: dict = None, method: str = "GET", data: dict = None):
+    """Query PostgREST endpoint using the app's shared HTTP client"""
+    client = request.app.state.http
+    url = _url(endpoint, params)
+    if method == "GET":
+        response = await client.get(url)
+    elif method == "POST":
+        response = await client.post(url, json=data)
+    elif method == "PATCH":
+        response = await client.patch(url, json=data)
+    elif method == "DELETE":
+        response = await client.delete(url)
+    else:
+        raise ValueError(f"Unsupported HTTP method: {method}")
+
+    response.raise_for_status()
+    return orjson.loads(response.content) if response.content else None
+
+def _raw_response(response) -> Response:
+    headers = {h: response.headers[h] for h in FORWARDED_HEADERS if h in response.headers}
+    return Response(response.content, media_type="application/json", headers=headers)
+
+async def query_postgrest_raw(request: Request, endpoint: str, params: dict = None, headers: dict = None) -> Response:
+    """GET a PostgREST endpoint and return its JSON body unparsed, for pass-through handlers"""
+    response = await request.app.state.http.get(_url(endpoint, params), headers=headers)
+    response.raise_for_status()
+    return _raw_response(response)
+
+async def count_rows(request: Request, endpoint: str, params: dict = None) -> int:
+    """Count the rows of a PostgREST endpoint matching `params` without fetching them"""
+    response = await request.app.state.http.head(_url(endpoint, params), headers={"Prefer": "count=exact"})
+    response.raise_for_status()
+    return int(response.headers["Content-Range"].rsplit("/", 1)[1])
+
+def clamp_limit(limit: int = None) -> int:
+    """Apply the default page size and keep a client supplied row limit within 1..MAX_PAGE_SIZE"""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def _is_missing_object(response) -> bool:
+    if response.status_code not in (400, 404):
+        return False
+    try:
+        return orjson.loads(response.content).get("code") in MISSING_OBJECT_CODES
+    except ValueError:
+        return False
+
+async def query_optional(request: Request, endpoint: str, params: dict = None, headers: dict = None, key: str = None, raw: bool = False):
+    """Query a PostgREST object created by the sql/ migrations.
+
+    Returns None when the object is not deployed, so callers can fall back to
+    computing the result from the base tables. `key` identifies the objects
+    used when the endpoint alone does not (e.g. an RPC plus an embedding).
+    With `raw`, the unparsed body is returned as a Response.
+    """
+    key = key or endpoint
+    if key in _missing_objects:
+        return None
+    response = await request.app.state.http.get(_url(endpoint, params), headers=headers)
+    if _is_missing_object(response):
+        _missing_objects.add(key)
+        return None
+    response.raise_for_status()
+    return _raw_response(response) if raw else orjson.loads(response.content)
+
+def http_error(e: Exception) -> HTTPException:
+    """Map an exception raised inside a route handler to the HTTPException returned to the client"""
+    # Validation errors raised by the handler itself keep their status
+    if isinstance(e, HTTPException):
+        return e
+    # A 4xx from PostgREST (e.g. a malformed filter) is the client's error, not ours
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        if 400 <= status < 500 and status not in UPSTREAM_AUTH_ERRORS:
+            try:
+                detail = orjson.loads(e.response.content).get("message") or e.response.text
+            except (ValueError, AttributeError):
+                detail = e.response.text
+            return HTTPException(status_code=status, detail=detail)
+    return HTTPException(status_code=500, detail=str(e))
+
+# Filter builders: user input is escaped so it is matched literally and cannot
+# break out of the PostgREST filter grammar. The one exception is *, which
+# matches any run of characters, as PostgREST filters always have, so masked
+# card numbers like ****-****-****-1234 still find the card.
+
+def like_escape(value: str) -> str:
+    """Escape LIKE wildcards except * (for SQL and RPC arguments), which becomes %"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("*", "%")
+
+@lru_cache(maxsize=1024)
+def like_pattern(value: str) -> str:
+    """Build an ilike pattern matching `value` anywhere, with LIKE wildcards other than * escaped"""
+    # PostgREST matches an unescaped % like *, so the escaped value is used as-is
+    return f"*{like_escape(value)}*"
+
+def quote_value(value: str) -> str:
+    """Double-quote a column or value for use inside an or=/and= list"""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+@lru_cache(maxsize=1024)
+def ilike_any(columns: tuple, value: str) -> str:
+    """Build an or=(...) filter matching `value` as a substring of any of `columns`"""
+    pattern = quote_value(like_pattern(value))
+    return "(" + ",".join(f"{quote_value(column)}.ilike.{pattern}" for column in columns) + ")"
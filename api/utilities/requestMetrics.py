@@ -0,0 +1,68 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import time
+
+# Per-route request counts and latencies since the worker started, keyed by
+# "METHOD /route/{template}" so path parameters share one entry
+_routes = {}
+
+class RequestMetricsMiddleware:
+    """Time every HTTP request and record it under the route that handled it"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Routing stores the matched route on the scope; unmatched paths are not recorded
+            route = scope.get("route")
+            if route is not None:
+                record(f"{scope['method']} {route_template(scope['path'], route)}", time.perf_counter() - start, status)
+
+# Full path template of the matched route, e.g. /transactions/search_by_mcc.
+# Newer FastAPI keeps an included route's path relative to its router, so the
+# include prefix is the start of the request path that the route did not match.
+def route_template(path: str, route) -> str:
+    # Candidate prefixes end before a "/", or take the whole path for a route at ""
+    for start in [i for i, c in enumerate(path) if c == "/"] + [len(path)]:
+        if route.path_regex.match(path[start:]):
+            return path[:start] + route.path
+    return route.path
+
+# Add one request's duration to its route's totals
+def record(key: str, seconds: float, status: int):
+    stats = _routes.get(key)
+    if stats is None:
+        stats = _routes[key] = {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+    stats["count"] += 1
+    if status >= 500:
+        stats["errors"] += 1
+    stats["total_seconds"] += seconds
+    if seconds > stats["max_seconds"]:
+        stats["max_seconds"] = seconds
+
+def metrics_snapshot() -> dict:
+    """Recorded routes, slowest total time first, with latencies in milliseconds"""
+    return {
+        key: {
+            "count": stats["count"],
+            "errors": stats["errors"],
+            "total_ms": round(stats["total_seconds"] * 1000, 2),
+            "average_ms": round(stats["total_seconds"] * 1000 / stats["count"], 2),
+            "max_ms": round(stats["max_seconds"] * 1000, 2)
+        }
+        for key, stats in sorted(_routes.items(), key=lambda x: x[1]["total_seconds"], reverse=True)
+    }
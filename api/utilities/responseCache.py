@@ -0,0 +1,167 @@
+from fastapi import Response
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from redis.exceptions import RedisError
+import asyncio
+import hashlib
+import logging
+import orjson
+import time
+
+logger = logging.getLogger(__name__)
+
+# TTL policy (seconds): short for free-text searches, normal for filtered lists,
+# long for near-static lookups like distinct values and statistics
+CACHE_TTL_SHORT = 10
+CACHE_TTL_NORMAL = 60
+CACHE_TTL_LONG = 300
+
+# Response headers stored alongside the cached body
+CACHED_HEADERS = ("content-range",)
+
+# How long past max-age a CDN or browser may serve a response while it refetches
+STALE_WHILE_REVALIDATE = 300
+
+# In-process tier in front of Redis, so repeats of a hot request skip even the
+# Redis round trip. Entries are capped at LOCAL_TTL seconds so workers never
+# drift far from each other, and the least recently used are evicted first.
+LOCAL_TTL = 5
+LOCAL_MAX_ENTRIES = 1024
+_local = OrderedDict()
+
+# Handler calls currently running, per cache key. Concurrent identical requests
+# await the same call instead of each querying PostgREST.
+_inflight = {}
+
+def cache_key(request) -> str:
+    """Build a cache key from the request path and its sorted query params"""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"resp:{request.url.path}?{query}"
+
+def _pack(body: bytes, headers: dict) -> bytes:
+    # orjson never emits a raw newline, so it safely separates headers from body
+    return orjson.dumps(headers) + b"\n" + body
+
+def _unpack(value: bytes):
+    headers, body = value.split(b"\n", 1)
+    return body, orjson.loads(headers)
+
+def _serialize(result):
+    if isinstance(result, Response):
+        return result.body, {h: result.headers[h] for h in CACHED_HEADERS if h in result.headers}
+    return orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS), {}
+
+def _etag_matches(request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def conditional_response(request, body: bytes, headers: dict, cache_control: str) -> Response:
+    """Serve a JSON body with an ETag, answering a matching If-None-Match with 304"""
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = dict(headers, etag=etag)
+    headers["cache-control"] = cache_control
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"etag": etag, "cache-control": cache_control})
+    return Response(body, media_type="application/json", headers=headers)
+
+def _local_get(key: str):
+    entry = _local.get(key)
+    if entry is None:
+        return None
+    expires, body, headers = entry
+    if expires <= time.monotonic():
+        del _local[key]
+        return None
+    _local.move_to_end(key)
+    return body, headers
+
+def _local_store(key: str, body: bytes, headers: dict, ttl: int):
+    _local[key] = (time.monotonic() + min(ttl, LOCAL_TTL), body, headers)
+    _local.move_to_end(key)
+    if len(_local) > LOCAL_MAX_ENTRIES:
+        _local.popitem(last=False)
+
+async def _singleflight(key: str, fetch):
+    future = _inflight.get(key)
+    if future is not None:
+        # shield: a cancelled follower must not cancel the shared call
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await fetch()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved when there are no followers
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del _inflight[key]
+
+async def _redis_get(redis, key: str):
+    try:
+        return await redis.get(key)
+    except RedisError as e:
+        logger.warning("Redis GET failed for %s: %s", key, e)
+        return None
+
+async def _redis_store(redis, key: str, body: bytes, ttl: int):
+    try:
+        await redis.set(key, body, ex=ttl)
+    except RedisError as e:
+        logger.warning("Redis SET failed for %s: %s", key, e)
+
+def cached(ttl: int, public: bool = False):
+    """Cache a GET handler's result in Redis for `ttl` seconds.
+
+    The handler must accept a `request: Request` argument and return JSON data
+    or a JSON Response. Hits are served as the stored bytes without
+    re-serializing, and every response carries an ETag so repeat clients get a
+    304. Results are also kept in process memory for up to LOCAL_TTL seconds.
+    Redis caching is skipped when no client is configured on `app.state.redis`.
+    Only `public` routes (catalogs and lookups) let browsers and CDNs cache
+    them too; the rest carry customer or transaction data and are never stored.
+    """
+    cache_control = f"public, max-age={ttl}, stale-while-revalidate={STALE_WHILE_REVALIDATE}" if public else "private, no-store"
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs["request"]
+            redis = getattr(request.app.state, "redis", None)
+            key = cache_key(request)
+
+            local = _local_get(key)
+            if local is not None:
+                return conditional_response(request, *local, cache_control)
+
+            hit = await _redis_get(redis, key) if redis is not None else None
+            if hit is not None:
+                body, headers = _unpack(hit)
+                _local_store(key, body, headers, ttl)
+                return conditional_response(request, body, headers, cache_control)
+
+            async def fetch():
+                body, headers = _serialize(await func(*args, **kwargs))
+                _local_store(key, body, headers, ttl)
+                if redis is not None:
+                    await _redis_store(redis, key, _pack(body, headers), ttl)
+                return body, headers
+
+            body, headers = await _singleflight(key, fetch)
+            return conditional_response(request, body, headers, cache_control)
+        return wrapper
+    return decorator
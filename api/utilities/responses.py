@@ -0,0 +1,9 @@
+from fastapi.responses import JSONResponse
+import orjson
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, which is several times faster than the stdlib encoder"""
+
+    def render(self, content) -> bytes:
+        # OPT_NON_STR_KEYS allows dicts keyed by ints, e.g. MCC codes
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
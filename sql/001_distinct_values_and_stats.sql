@@ -0,0 +1,74 @@
+-- Distinct lookups and customer statistics computed in the database, exposed
+-- through PostgREST as /rpc/<function_name>. Safe to re-run.
+
+-- Btree indexes so DISTINCT / GROUP BY on these columns can use index scans
+CREATE INDEX IF NOT EXISTS bob_ccholders_card_type_idx ON bob_credit_card_holders ("Card Type");
+CREATE INDEX IF NOT EXISTS bob_ccholders_state_idx ON bob_credit_card_holders ("State");
+CREATE INDEX IF NOT EXISTS offers_category_idx ON offers (category);
+CREATE INDEX IF NOT EXISTS offers_brand_idx ON offers (brand);
+
+CREATE OR REPLACE FUNCTION bob_card_types_distinct()
+RETURNS TABLE ("Card Type" text)
+LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT "Card Type" FROM bob_credit_card_holders
+    WHERE "Card Type" IS NOT NULL AND "Card Type" <> ''
+    ORDER BY 1;
+$$;
+
+CREATE OR REPLACE FUNCTION bob_states_distinct()
+RETURNS TABLE ("State" text)
+LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT "State" FROM bob_credit_card_holders
+    WHERE "State" IS NOT NULL AND "State" <> ''
+    ORDER BY 1;
+$$;
+
+CREATE OR REPLACE FUNCTION offer_categories_distinct()
+RETURNS TABLE (category text)
+LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT category FROM offers
+    WHERE category IS NOT NULL AND category <> ''
+    ORDER BY 1;
+$$;
+
+CREATE OR REPLACE FUNCTION offer_brands_distinct()
+RETURNS TABLE (brand text)
+LANGUAGE sql STABLE AS $$
+    SELECT DISTINCT brand FROM offers
+    WHERE brand IS NOT NULL AND brand <> ''
+    ORDER BY 1;
+$$;
+
+-- Same shape as GET /customers/statistics. json (not jsonb) keeps the
+-- ORDER BY of the aggregated objects, so top_5_states stays sorted by count.
+CREATE OR REPLACE FUNCTION bob_customer_stats()
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    SELECT json_build_object(
+        'total_customers', (SELECT count(*) FROM bob_credit_card_holders),
+        'card_type_distribution', (
+            SELECT coalesce(json_object_agg(card_type, n ORDER BY n DESC), '{}'::json)
+            FROM (
+                SELECT coalesce("Card Type", 'Unknown') AS card_type, count(*) AS n
+                FROM bob_credit_card_holders GROUP BY 1
+            ) t
+        ),
+        'credit_limit_stats', (
+            SELECT json_build_object(
+                'average', coalesce(round(avg("Credit Limit"), 2), 0),
+                'maximum', coalesce(max("Credit Limit"), 0),
+                'minimum', coalesce(min("Credit Limit"), 0)
+            )
+            FROM bob_credit_card_holders
+            WHERE "Credit Limit" <> 0
+        ),
+        'top_5_states', (
+            SELECT coalesce(json_object_agg(state, n ORDER BY n DESC), '{}'::json)
+            FROM (
+                SELECT coalesce("State", 'Unknown') AS state, count(*) AS n
+                FROM bob_credit_card_holders GROUP BY 1
+                ORDER BY n DESC LIMIT 5
+            ) t
+        )
+    );
+$$;
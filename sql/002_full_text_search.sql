@@ -0,0 +1,60 @@
+-- Full-text search for the /search endpoints. Safe to re-run.
+--
+-- search_tsv(<table>) is a PostgREST computed field: it can be filtered on
+-- (?search_tsv=plfts(simple).term) without adding a column to the table, so
+-- `select=*` responses are unchanged. The GIN indexes are built on the same
+-- expression, which the planner matches once the function is inlined.
+
+CREATE OR REPLACE FUNCTION search_tsv(offers)
+RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT to_tsvector('simple',
+        coalesce($1.title, '') || ' ' || coalesce($1.description, '') || ' ' ||
+        coalesce($1.category, '') || ' ' || coalesce($1.brand, '') || ' ' ||
+        coalesce($1.offer_details, ''));
+$$;
+
+CREATE OR REPLACE FUNCTION search_tsv(bob_credit_card_types)
+RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT to_tsvector('simple',
+        coalesce($1.card_name, '') || ' ' || coalesce($1.type, '') || ' ' ||
+        coalesce($1.key_features_and_benefits, '') || ' ' || coalesce($1.target_audience, ''));
+$$;
+
+CREATE OR REPLACE FUNCTION search_tsv(bob_credit_card_holders)
+RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT to_tsvector('simple',
+        coalesce($1."Cardholder Name", '') || ' ' || coalesce($1."Card No.", '') || ' ' ||
+        coalesce($1."Card Type", '') || ' ' || coalesce($1."State", ''));
+$$;
+
+CREATE INDEX IF NOT EXISTS offers_fts_gin ON offers USING gin (search_tsv(offers));
+CREATE INDEX IF NOT EXISTS bob_cctypes_fts_gin ON bob_credit_card_types USING gin (search_tsv(bob_credit_card_types));
+CREATE INDEX IF NOT EXISTS bob_ccholders_fts_gin ON bob_credit_card_holders USING gin (search_tsv(bob_credit_card_holders));
+
+-- Relevance-ranked search, called as /rpc/<name>?q=term&limit=n
+CREATE OR REPLACE FUNCTION search_offers(q text)
+RETURNS SETOF offers
+LANGUAGE sql STABLE AS $$
+    SELECT o.* FROM offers o
+    WHERE search_tsv(o) @@ plainto_tsquery('simple', q)
+    ORDER BY ts_rank_cd(search_tsv(o), plainto_tsquery('simple', q)) DESC;
+$$;
+
+CREATE OR REPLACE FUNCTION search_credit_cards(q text)
+RETURNS SETOF bob_credit_card_types
+LANGUAGE sql STABLE AS $$
+    SELECT c.* FROM bob_credit_card_types c
+    WHERE search_tsv(c) @@ plainto_tsquery('simple', q)
+    ORDER BY ts_rank_cd(search_tsv(c), plainto_tsquery('simple', q)) DESC;
+$$;
+
+CREATE OR REPLACE FUNCTION search_customers(q text)
+RETURNS SETOF bob_credit_card_holders
+LANGUAGE sql STABLE AS $$
+    SELECT h.* FROM bob_credit_card_holders h
+    WHERE search_tsv(h) @@ plainto_tsquery('simple', q)
+    ORDER BY ts_rank_cd(search_tsv(h), plainto_tsquery('simple', q)) DESC;
+$$;
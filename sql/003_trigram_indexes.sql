@@ -0,0 +1,12 @@
+-- Trigram indexes so substring ILIKE '%term%' filters (partial card numbers,
+-- names, merchants) use an index scan. Full-text search cannot cover these:
+-- "5678" is not a lexeme of "1234567812345678". Safe to re-run.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS bob_ccholders_cardno_trgm ON bob_credit_card_holders USING gin ("Card No." gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS bob_ccholders_name_trgm ON bob_credit_card_holders USING gin ("Cardholder Name" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS bob_ccholders_state_trgm ON bob_credit_card_holders USING gin ("State" gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS transactions_card_no_trgm ON transactions USING gin (card_no gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS transactions_particulars_trgm ON transactions USING gin (particulars gin_trgm_ops);
@@ -0,0 +1,13 @@
+-- Lets PostgREST embed the matching card type rows into customer queries:
+--   /bob_credit_card_holders?select=*,card_types(*)
+-- bob_credit_card_types.type is not unique, so a foreign key is not possible;
+-- a computed relationship (PostgREST 11+) gives the same one-query join.
+-- Safe to re-run.
+
+CREATE INDEX IF NOT EXISTS bob_cctypes_type_idx ON bob_credit_card_types (type);
+
+CREATE OR REPLACE FUNCTION card_types(bob_credit_card_holders)
+RETURNS SETOF bob_credit_card_types
+LANGUAGE sql STABLE ROWS 5 AS $$
+    SELECT * FROM bob_credit_card_types WHERE type = $1."Card Type";
+$$;
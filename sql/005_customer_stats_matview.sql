@@ -0,0 +1,63 @@
+-- Precomputed customer statistics. bob_customer_stats() (sql/001) becomes a
+-- single-row read. The view is refreshed every 5 minutes by pg_cron when it
+-- is installed; otherwise run SELECT refresh_bob_customer_stats(); from any
+-- scheduler. Writes to the holders table never wait on a refresh. Safe to
+-- re-run.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS bob_customer_stats_mv AS
+SELECT 1 AS id, json_build_object(
+    'total_customers', (SELECT count(*) FROM bob_credit_card_holders),
+    'card_type_distribution', (
+        SELECT coalesce(json_object_agg(card_type, n ORDER BY n DESC), '{}'::json)
+        FROM (
+            SELECT coalesce("Card Type", 'Unknown') AS card_type, count(*) AS n
+            FROM bob_credit_card_holders GROUP BY 1
+        ) t
+    ),
+    'credit_limit_stats', (
+        SELECT json_build_object(
+            'average', coalesce(round(avg("Credit Limit"), 2), 0),
+            'maximum', coalesce(max("Credit Limit"), 0),
+            'minimum', coalesce(min("Credit Limit"), 0)
+        )
+        FROM bob_credit_card_holders
+        WHERE "Credit Limit" <> 0
+    ),
+    'top_5_states', (
+        SELECT coalesce(json_object_agg(state, n ORDER BY n DESC), '{}'::json)
+        FROM (
+            SELECT coalesce("State", 'Unknown') AS state, count(*) AS n
+            FROM bob_credit_card_holders GROUP BY 1
+            ORDER BY n DESC LIMIT 5
+        ) t
+    )
+) AS stats;
+
+-- Unique index required by REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS bob_customer_stats_mv_id ON bob_customer_stats_mv (id);
+
+CREATE OR REPLACE FUNCTION bob_customer_stats()
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    SELECT stats FROM bob_customer_stats_mv;
+$$;
+
+-- Earlier versions refreshed the view from a trigger, so every write statement
+-- waited on a full refresh and writers other than the view's owner failed
+DROP TRIGGER IF EXISTS bob_ccholders_refresh_stats ON bob_credit_card_holders;
+DROP FUNCTION IF EXISTS refresh_bob_customer_stats();
+
+CREATE FUNCTION refresh_bob_customer_stats()
+RETURNS void
+LANGUAGE sql AS $$
+    REFRESH MATERIALIZED VIEW CONCURRENTLY bob_customer_stats_mv;
+$$;
+
+-- cron.schedule() replaces an existing job of the same name, so re-runs keep one job
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('refresh_bob_customer_stats', '*/5 * * * *', 'SELECT refresh_bob_customer_stats()');
+    END IF;
+END;
+$$;
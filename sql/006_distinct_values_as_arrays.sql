@@ -0,0 +1,41 @@
+-- Return distinct lookups as text[] so PostgREST sends a plain JSON array of
+-- strings (["Gold", "Platinum"]) instead of an object per value, and the API
+-- can pass the body through unparsed. Replaces the *_distinct functions from
+-- sql/001. Safe to re-run.
+
+CREATE OR REPLACE FUNCTION bob_card_types()
+RETURNS text[]
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(array_agg(DISTINCT "Card Type" ORDER BY "Card Type"), '{}')
+    FROM bob_credit_card_holders
+    WHERE "Card Type" IS NOT NULL AND "Card Type" <> '';
+$$;
+
+CREATE OR REPLACE FUNCTION bob_states()
+RETURNS text[]
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(array_agg(DISTINCT "State" ORDER BY "State"), '{}')
+    FROM bob_credit_card_holders
+    WHERE "State" IS NOT NULL AND "State" <> '';
+$$;
+
+CREATE OR REPLACE FUNCTION offer_categories()
+RETURNS text[]
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(array_agg(DISTINCT category ORDER BY category), '{}')
+    FROM offers
+    WHERE category IS NOT NULL AND category <> '';
+$$;
+
+CREATE OR REPLACE FUNCTION offer_brands()
+RETURNS text[]
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(array_agg(DISTINCT brand ORDER BY brand), '{}')
+    FROM offers
+    WHERE brand IS NOT NULL AND brand <> '';
+$$;
+
+DROP FUNCTION IF EXISTS bob_card_types_distinct();
+DROP FUNCTION IF EXISTS bob_states_distinct();
+DROP FUNCTION IF EXISTS offer_categories_distinct();
+DROP FUNCTION IF EXISTS offer_brands_distinct();
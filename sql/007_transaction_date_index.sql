@@ -0,0 +1,32 @@
+-- Date-range filtering on transactions in the database. txn_date is stored as
+-- DD/MM/YYYY text, which neither sorts nor compares chronologically.
+--
+-- txn_date_iso(<row>) is a PostgREST computed field, so clients can filter and
+-- order on it (?txn_date_iso=gte.2025-06-01&order=txn_date_iso.desc) while
+-- `select=*` responses are unchanged. to_date() is only STABLE, so the date is
+-- built with make_date() to keep the function IMMUTABLE and indexable.
+-- Empty, malformed or impossible dates (e.g. 31/02/2025) give NULL instead of
+-- an error, so they can neither break the index build nor fail an insert,
+-- matching the API, which skips dates it cannot parse. Safe to re-run.
+
+CREATE OR REPLACE FUNCTION txn_date_iso(transactions)
+RETURNS date
+LANGUAGE sql IMMUTABLE AS $$
+    -- CASE branches are tried in order, so each one only sees input the
+    -- earlier ones accepted
+    SELECT CASE
+        WHEN $1.txn_date !~ '^\d{2}/\d{2}/\d{4}$' THEN NULL
+        WHEN substr($1.txn_date, 7, 4)::int = 0
+          OR substr($1.txn_date, 4, 2)::int NOT BETWEEN 1 AND 12 THEN NULL
+        -- Compared with the last day of that month
+        WHEN substr($1.txn_date, 1, 2)::int BETWEEN 1 AND extract(day FROM
+            make_date(substr($1.txn_date, 7, 4)::int, substr($1.txn_date, 4, 2)::int, 1)
+            + interval '1 month - 1 day')
+        THEN make_date(
+            substr($1.txn_date, 7, 4)::int,
+            substr($1.txn_date, 4, 2)::int,
+            substr($1.txn_date, 1, 2)::int)
+    END;
+$$;
+
+CREATE INDEX IF NOT EXISTS transactions_txn_date_iso_idx ON transactions (txn_date_iso(transactions));
@@ -0,0 +1,44 @@
+-- Aggregates behind /transactions/get_transaction_summary, exposed through
+-- PostgREST as /rpc/<function_name>?card=<partial card number>. The API calls
+-- them concurrently, so each is a small independent query. Safe to re-run.
+
+-- Amount statistics ignore null and zero amounts, like the API always has
+CREATE OR REPLACE FUNCTION transaction_amount_stats(card text DEFAULT NULL)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    SELECT json_build_object(
+        'total_transactions', count(*),
+        'total_amount', coalesce(sum(source_amt) FILTER (WHERE source_amt <> 0), 0),
+        'average_amount', coalesce(avg(source_amt) FILTER (WHERE source_amt <> 0), 0),
+        'maximum_amount', coalesce(max(source_amt) FILTER (WHERE source_amt <> 0), 0),
+        'minimum_amount', coalesce(min(source_amt) FILTER (WHERE source_amt <> 0), 0)
+    )
+    FROM transactions
+    WHERE card IS NULL OR card_no ILIKE '%' || card || '%';
+$$;
+
+CREATE OR REPLACE FUNCTION transaction_top_mcc(card text DEFAULT NULL)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(json_object_agg(mcc, n ORDER BY n DESC, mcc), '{}'::json)
+    FROM (
+        SELECT "MCC" AS mcc, count(*) AS n
+        FROM transactions
+        WHERE "MCC" <> 0 AND (card IS NULL OR card_no ILIKE '%' || card || '%')
+        GROUP BY 1
+        ORDER BY n DESC, mcc
+        LIMIT 5
+    ) t;
+$$;
+
+CREATE OR REPLACE FUNCTION transaction_currency_counts(card text DEFAULT NULL)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(json_object_agg(currency, n ORDER BY n DESC), '{}'::json)
+    FROM (
+        SELECT coalesce(source_currency, 'Unknown') AS currency, count(*) AS n
+        FROM transactions
+        WHERE card IS NULL OR card_no ILIKE '%' || card || '%'
+        GROUP BY 1
+    ) t;
+$$;
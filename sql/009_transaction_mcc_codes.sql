@@ -0,0 +1,13 @@
+-- Distinct MCC codes for /transactions/get_mcc_categories, returned as int[]
+-- so PostgREST sends a plain JSON array the API passes through unparsed.
+-- The btree index lets DISTINCT use an index-only scan. Safe to re-run.
+
+CREATE INDEX IF NOT EXISTS transactions_mcc_idx ON transactions ("MCC");
+
+CREATE OR REPLACE FUNCTION transaction_mcc_codes()
+RETURNS int[]
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(array_agg(DISTINCT "MCC"::int ORDER BY "MCC"::int), '{}')
+    FROM transactions
+    WHERE "MCC" IS NOT NULL AND "MCC" <> 0;
+$$;
@@ -0,0 +1,24 @@
+-- Single function behind /transactions/search_by_card_advanced, called as
+-- /rpc/search_card_advanced?card=1234&mcc=5411&limit=n. Filters left out of
+-- the call default to NULL and drop out of the WHERE clause, so every
+-- combination is one statement PostgREST does not have to rebuild. Ordering
+-- and limit are applied by PostgREST on the result. Safe to re-run.
+
+CREATE OR REPLACE FUNCTION search_card_advanced(
+    card text,
+    mcc int DEFAULT NULL,
+    merchant text DEFAULT NULL,
+    min_amount float8 DEFAULT NULL,
+    month int DEFAULT NULL,
+    year int DEFAULT NULL
+)
+RETURNS SETOF transactions
+LANGUAGE sql STABLE AS $$
+    SELECT t.* FROM transactions t
+    WHERE t.card_no ILIKE '%' || card || '%'
+      AND (mcc IS NULL OR t."MCC" = mcc)
+      AND (merchant IS NULL OR t.particulars ILIKE '%' || merchant || '%')
+      AND (min_amount IS NULL OR t.source_amt >= min_amount)
+      AND (month IS NULL OR year IS NULL
+           OR t.txn_date LIKE '%/' || lpad(month::text, 2, '0') || '/' || year::text);
+$$;
@@ -0,0 +1,9 @@
+-- /transactions/search ORs substring matches on card_no, particulars and
+-- ref_no. sql/003 indexes the first two, but a BitmapOr needs an index on
+-- every branch, so without this one the whole OR falls back to a sequential
+-- scan. Full-text search is not used for the same reason as in sql/003:
+-- partial card and reference numbers are not lexemes. Safe to re-run.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS transactions_ref_no_trgm ON transactions USING gin (ref_no gin_trgm_ops);
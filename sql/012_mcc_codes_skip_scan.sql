@@ -0,0 +1,21 @@
+-- transaction_mcc_codes() (sql/009) read every entry of transactions_mcc_idx
+-- to find a few hundred distinct codes. Postgres has no skip scan before v18,
+-- so this emulates one with a recursive CTE: each step jumps to the next
+-- larger code with a single index probe, making the cost proportional to the
+-- number of distinct codes rather than the number of transactions.
+-- Safe to re-run.
+
+CREATE OR REPLACE FUNCTION transaction_mcc_codes()
+RETURNS int[]
+LANGUAGE sql STABLE AS $$
+    WITH RECURSIVE codes (mcc) AS (
+        (SELECT "MCC" FROM transactions WHERE "MCC" IS NOT NULL ORDER BY "MCC" LIMIT 1)
+        UNION ALL
+        SELECT (SELECT t."MCC" FROM transactions t WHERE t."MCC" > c.mcc ORDER BY t."MCC" LIMIT 1)
+        FROM codes c
+        WHERE c.mcc IS NOT NULL
+    )
+    SELECT coalesce(array_agg(mcc::int ORDER BY mcc), '{}')
+    FROM codes
+    WHERE mcc IS NOT NULL AND mcc <> 0;
+$$;
@@ -0,0 +1,50 @@
+-- /transactions/get_transaction_summary as one function, called as
+-- /rpc/transaction_summary?card=<partial card number>. The matching rows are
+-- read once into a MATERIALIZED CTE and every statistic is computed from it,
+-- instead of the three functions from sql/008 each scanning the table. The
+-- result is the endpoint's complete JSON body, so the API passes it through.
+-- Safe to re-run.
+
+CREATE OR REPLACE FUNCTION transaction_summary(card text DEFAULT NULL)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    WITH matched AS MATERIALIZED (
+        SELECT source_amt, "MCC" AS mcc, coalesce(source_currency, 'Unknown') AS currency
+        FROM transactions
+        WHERE card IS NULL OR card_no ILIKE '%' || card || '%'
+    ),
+    -- Amount statistics ignore null and zero amounts, like the API always has
+    amounts AS (
+        SELECT sum(source_amt) AS total, avg(source_amt) AS average,
+               max(source_amt) AS maximum, min(source_amt) AS minimum
+        FROM matched
+        WHERE source_amt <> 0
+    )
+    SELECT CASE WHEN NOT EXISTS (SELECT 1 FROM matched)
+        THEN json_build_object('message', 'No transaction data found')
+        ELSE json_build_object(
+            'total_transactions', (SELECT count(*) FROM matched),
+            'total_amount', coalesce(round(a.total::numeric, 2), 0),
+            'average_amount', coalesce(round(a.average::numeric, 2), 0),
+            'maximum_amount', coalesce(a.maximum, 0),
+            'minimum_amount', coalesce(a.minimum, 0),
+            'top_5_mcc_codes', (
+                SELECT coalesce(json_object_agg(mcc, n ORDER BY n DESC, mcc), '{}'::json)
+                FROM (
+                    SELECT mcc, count(*) AS n FROM matched
+                    WHERE mcc <> 0
+                    GROUP BY mcc ORDER BY n DESC, mcc LIMIT 5
+                ) t
+            ),
+            'currency_distribution', (
+                SELECT coalesce(json_object_agg(currency, n ORDER BY n DESC), '{}'::json)
+                FROM (SELECT currency, count(*) AS n FROM matched GROUP BY currency) t
+            )
+        )
+    END
+    FROM amounts a;
+$$;
+
+DROP FUNCTION IF EXISTS transaction_amount_stats(text);
+DROP FUNCTION IF EXISTS transaction_top_mcc(text);
+DROP FUNCTION IF EXISTS transaction_currency_counts(text);
@@ -0,0 +1,68 @@
+-- Per-card and per-month aggregates behind /transactions/aggregate_by_card and
+-- /transactions/aggregate_by_month, computed with one GROUP BY each and
+-- returned as the endpoints' "aggregations" object. Like the API, only rows
+-- with a non-zero amount are counted, and months skip rows whose date does
+-- not parse. Requires sql/007 (txn_date_iso).
+-- Safe to re-run.
+
+CREATE OR REPLACE FUNCTION transaction_card_aggregates(mcc int DEFAULT NULL, min_transactions int DEFAULT 1)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(json_object_agg(card_no, json_build_object(
+        'card_number_masked', CASE WHEN length(card_no) >= 4 THEN '****-****-****-' || right(card_no, 4) ELSE card_no END,
+        'transaction_count', n,
+        'total_amount', round(total::numeric, 2),
+        'average_amount', round((total / n)::numeric, 2),
+        'min_amount', round(minimum::numeric, 2),
+        'max_amount', round(maximum::numeric, 2),
+        'total_reward_points', points,
+        'average_reward_points', round(points::numeric / n, 2),
+        'unique_mcc_codes', cardinality(mcc_codes),
+        'mcc_codes_used', mcc_codes
+    ) ORDER BY round(total::numeric, 2) DESC), '{}'::json)
+    FROM (
+        SELECT card_no, count(*) AS n, sum(source_amt) AS total,
+               min(source_amt) AS minimum, max(source_amt) AS maximum,
+               sum(coalesce(reward_points, 0)) AS points,
+               coalesce(array_agg(DISTINCT "MCC") FILTER (WHERE "MCC" <> 0), '{}') AS mcc_codes
+        FROM transactions
+        WHERE card_no <> '' AND source_amt <> 0
+          AND (mcc IS NULL OR "MCC" = mcc)
+        GROUP BY card_no
+        HAVING count(*) >= min_transactions
+    ) t;
+$$;
+
+CREATE OR REPLACE FUNCTION transaction_month_aggregates(card text DEFAULT NULL, year int DEFAULT NULL, min_transactions int DEFAULT 1)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(json_object_agg(to_char(month_start, 'YYYY-MM'), json_build_object(
+        'month_name', to_char(month_start, 'FMMonth YYYY'),
+        'year', extract(year FROM month_start)::int,
+        'month', extract(month FROM month_start)::int,
+        'transaction_count', n,
+        'total_amount', round(total::numeric, 2),
+        'average_amount', round((total / n)::numeric, 2),
+        'min_amount', round(minimum::numeric, 2),
+        'max_amount', round(maximum::numeric, 2),
+        'total_reward_points', points,
+        'average_reward_points', round(points::numeric / n, 2),
+        'unique_cards', cards,
+        'unique_mcc_codes', mcc_codes
+    ) ORDER BY month_start), '{}'::json)
+    FROM (
+        SELECT date_trunc('month', txn_date_iso(t))::date AS month_start,
+               count(*) AS n, sum(t.source_amt) AS total,
+               min(t.source_amt) AS minimum, max(t.source_amt) AS maximum,
+               sum(coalesce(t.reward_points, 0)) AS points,
+               count(DISTINCT t.card_no) AS cards,
+               count(DISTINCT t."MCC") FILTER (WHERE t."MCC" <> 0) AS mcc_codes
+        FROM transactions t
+        WHERE t.txn_date <> '' AND txn_date_iso(t) IS NOT NULL AND t.source_amt <> 0
+          AND (card IS NULL OR t.card_no ILIKE '%' || card || '%')
+          AND (year IS NULL OR (txn_date_iso(t) >= make_date(year, 1, 1)
+                                AND txn_date_iso(t) < make_date(year + 1, 1, 1)))
+        GROUP BY 1
+        HAVING count(*) >= min_transactions
+    ) m;
+$$;
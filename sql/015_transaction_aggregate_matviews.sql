@@ -0,0 +1,131 @@
+-- Pre-grouped transactions behind /transactions/get_transaction_summary and
+-- /transactions/aggregate_by_month. transaction_summary() (sql/013) and
+-- transaction_month_aggregates() (sql/014) now combine a few rows per card
+-- instead of scanning the table. The views are grouped finely enough that
+-- the partial card filter still applies. They are refreshed every 5 minutes
+-- by pg_cron when it is installed; otherwise run
+-- SELECT refresh_transaction_aggregates(); from any scheduler. Writes to
+-- transactions never wait on a refresh. Requires sql/007 (txn_date_iso).
+-- Safe to re-run.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS transaction_summary_mv AS
+SELECT card_no, "MCC" AS mcc, coalesce(source_currency, 'Unknown') AS currency,
+       count(*) AS n,
+       -- Amount statistics ignore null and zero amounts, like the API always has
+       count(*) FILTER (WHERE source_amt <> 0) AS amount_n,
+       sum(source_amt) FILTER (WHERE source_amt <> 0) AS total,
+       min(source_amt) FILTER (WHERE source_amt <> 0) AS minimum,
+       max(source_amt) FILTER (WHERE source_amt <> 0) AS maximum
+FROM transactions
+GROUP BY 1, 2, 3;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS transaction_month_mv AS
+SELECT date_trunc('month', txn_date_iso(t))::date AS month_start, t.card_no, t."MCC" AS mcc,
+       count(*) AS n, sum(t.source_amt) AS total,
+       min(t.source_amt) AS minimum, max(t.source_amt) AS maximum,
+       sum(coalesce(t.reward_points, 0)) AS points
+FROM transactions t
+WHERE t.txn_date <> '' AND txn_date_iso(t) IS NOT NULL AND t.source_amt <> 0
+GROUP BY 1, 2, 3;
+
+-- Unique indexes required by REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS transaction_summary_mv_key ON transaction_summary_mv (card_no, mcc, currency);
+CREATE UNIQUE INDEX IF NOT EXISTS transaction_month_mv_key ON transaction_month_mv (month_start, card_no, mcc);
+
+CREATE OR REPLACE FUNCTION transaction_summary(card text DEFAULT NULL)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    WITH matched AS MATERIALIZED (
+        SELECT * FROM transaction_summary_mv
+        WHERE card IS NULL OR card_no ILIKE '%' || card || '%'
+    ),
+    amounts AS (
+        SELECT sum(total) AS total, sum(total) / nullif(sum(amount_n), 0) AS average,
+               max(maximum) AS maximum, min(minimum) AS minimum
+        FROM matched
+    )
+    SELECT CASE WHEN NOT EXISTS (SELECT 1 FROM matched)
+        THEN json_build_object('message', 'No transaction data found')
+        ELSE json_build_object(
+            'total_transactions', (SELECT sum(n) FROM matched),
+            'total_amount', coalesce(round(a.total::numeric, 2), 0),
+            'average_amount', coalesce(round(a.average::numeric, 2), 0),
+            'maximum_amount', coalesce(a.maximum, 0),
+            'minimum_amount', coalesce(a.minimum, 0),
+            'top_5_mcc_codes', (
+                SELECT coalesce(json_object_agg(mcc, n ORDER BY n DESC, mcc), '{}'::json)
+                FROM (
+                    SELECT mcc, sum(n) AS n FROM matched
+                    WHERE mcc <> 0
+                    GROUP BY mcc ORDER BY n DESC, mcc LIMIT 5
+                ) t
+            ),
+            'currency_distribution', (
+                SELECT coalesce(json_object_agg(currency, n ORDER BY n DESC), '{}'::json)
+                FROM (SELECT currency, sum(n) AS n FROM matched GROUP BY currency) t
+            )
+        )
+    END
+    FROM amounts a;
+$$;
+
+CREATE OR REPLACE FUNCTION transaction_month_aggregates(card text DEFAULT NULL, year int DEFAULT NULL, min_transactions int DEFAULT 1)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(json_object_agg(to_char(month_start, 'YYYY-MM'), json_build_object(
+        'month_name', to_char(month_start, 'FMMonth YYYY'),
+        'year', extract(year FROM month_start)::int,
+        'month', extract(month FROM month_start)::int,
+        'transaction_count', n,
+        'total_amount', round(total::numeric, 2),
+        'average_amount', round((total / n)::numeric, 2),
+        'min_amount', round(minimum::numeric, 2),
+        'max_amount', round(maximum::numeric, 2),
+        'total_reward_points', points,
+        'average_reward_points', round(points::numeric / n, 2),
+        'unique_cards', cards,
+        'unique_mcc_codes', mcc_codes
+    ) ORDER BY month_start), '{}'::json)
+    FROM (
+        SELECT month_start, sum(n)::bigint AS n, sum(total) AS total,
+               min(minimum) AS minimum, max(maximum) AS maximum,
+               sum(points)::bigint AS points,
+               count(DISTINCT card_no) AS cards,
+               count(DISTINCT mcc) FILTER (WHERE mcc <> 0) AS mcc_codes
+        FROM transaction_month_mv
+        -- Views built before unparseable dates were excluded can still hold a NULL month
+        WHERE month_start IS NOT NULL
+          AND (card IS NULL OR card_no ILIKE '%' || card || '%')
+          AND (year IS NULL OR (month_start >= make_date(year, 1, 1)
+                                AND month_start < make_date(year + 1, 1, 1)))
+        GROUP BY 1
+        HAVING sum(n) >= min_transactions
+    ) m;
+$$;
+
+-- Earlier versions refreshed the views from a trigger, so every write statement
+-- waited on a full refresh and was rolled back if the refresh failed
+DROP TRIGGER IF EXISTS transactions_refresh_aggregates ON transactions;
+DROP FUNCTION IF EXISTS refresh_transaction_aggregates();
+
+-- Also refreshes transaction_groups_mv once sql/017 has created it
+CREATE FUNCTION refresh_transaction_aggregates()
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY transaction_summary_mv;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY transaction_month_mv;
+    IF to_regclass('transaction_groups_mv') IS NOT NULL THEN
+        REFRESH MATERIALIZED VIEW CONCURRENTLY transaction_groups_mv;
+    END IF;
+END;
+$$;
+
+-- cron.schedule() replaces an existing job of the same name, so re-runs keep one job
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('refresh_transaction_aggregates', '*/5 * * * *', 'SELECT refresh_transaction_aggregates()');
+    END IF;
+END;
+$$;
@@ -0,0 +1,67 @@
+-- /transactions/aggregate_by_date_range in the database, called as
+-- /rpc/transaction_date_range_aggregates?from_date=2025-05-01&to_date=2025-07-31
+-- with optional card, mcc and group_by_days. Rows are found through the
+-- txn_date_iso index and bucketed into group_by_days periods counted from
+-- from_date. The result is the endpoint's "aggregations" object, or {} when
+-- nothing falls in the range. Requires sql/007 (txn_date_iso). Safe to re-run.
+
+CREATE OR REPLACE FUNCTION transaction_date_range_aggregates(
+    from_date date,
+    to_date date,
+    card text DEFAULT NULL,
+    mcc int DEFAULT NULL,
+    group_by_days int DEFAULT NULL
+)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    WITH matched AS MATERIALIZED (
+        SELECT txn_date_iso(t) AS day, t.card_no, t."MCC" AS code, t.source_amt, t.reward_points
+        FROM transactions t
+        WHERE txn_date_iso(t) BETWEEN from_date AND to_date
+          AND (card IS NULL OR t.card_no ILIKE '%' || card || '%')
+          AND (mcc IS NULL OR t."MCC" = mcc)
+    ),
+    periods AS (
+        SELECT (day - from_date) / group_by_days AS period,
+               count(*) AS n, sum(source_amt) AS total,
+               min(source_amt) AS minimum, max(source_amt) AS maximum,
+               sum(reward_points) AS points,
+               count(DISTINCT card_no) AS cards,
+               count(DISTINCT code) FILTER (WHERE code <> 0) AS codes
+        FROM matched
+        GROUP BY 1
+    )
+    SELECT CASE WHEN group_by_days > 0 THEN (
+        SELECT coalesce(json_object_agg('Group_' || (period + 1), json_build_object(
+            'date_range', to_char(from_date + period * group_by_days, 'DD/MM/YYYY') || ' to '
+                || to_char(least(from_date + (period + 1) * group_by_days - 1, to_date), 'DD/MM/YYYY'),
+            'transaction_count', n,
+            'total_amount', round(total::numeric, 2),
+            'average_amount', round((total / n)::numeric, 2),
+            'min_amount', round(minimum::numeric, 2),
+            'max_amount', round(maximum::numeric, 2),
+            'total_reward_points', points,
+            'average_reward_points', round(points::numeric / n, 2),
+            'unique_cards', cards,
+            'unique_mcc_codes', codes
+        ) ORDER BY period), '{}'::json)
+        FROM periods
+    ) ELSE coalesce((
+        -- Amount statistics ignore null and zero amounts, like the API always has
+        SELECT json_build_object('overall', json_build_object(
+            'date_range', to_char(from_date, 'DD/MM/YYYY') || ' to ' || to_char(to_date, 'DD/MM/YYYY'),
+            'transaction_count', count(*),
+            'total_amount', coalesce(round((sum(source_amt) FILTER (WHERE source_amt <> 0))::numeric, 2), 0),
+            'average_amount', coalesce(round((avg(source_amt) FILTER (WHERE source_amt <> 0))::numeric, 2), 0),
+            'min_amount', coalesce(round((min(source_amt) FILTER (WHERE source_amt <> 0))::numeric, 2), 0),
+            'max_amount', coalesce(round((max(source_amt) FILTER (WHERE source_amt <> 0))::numeric, 2), 0),
+            'total_reward_points', coalesce(sum(reward_points), 0),
+            'average_reward_points', coalesce(round(avg(reward_points), 2), 0),
+            'unique_cards', count(DISTINCT nullif(card_no, '')),
+            'unique_mcc_codes', count(DISTINCT code) FILTER (WHERE code <> 0)
+        ))
+        FROM matched
+        HAVING count(*) > 0
+    ), '{}'::json)
+    END;
+$$;
@@ -0,0 +1,114 @@
+-- /transactions/aggregate_comprehensive in the database, called as
+-- /rpc/transaction_comprehensive?card=1234&top_n=10 with optional mcc, month,
+-- year and min_amount. Statistics and the top MCCs, cards and months are read
+-- from transaction_groups_mv, which holds one row per month, card and MCC, so
+-- the card, MCC, month and year filters still apply. min_amount is a per-row
+-- filter, so when it is given the rows come from the base table instead.
+-- As in the API, rows whose txn_date does not parse still count everywhere
+-- except the month section, and the month/year filters exclude them.
+-- Returns every section but the filters echo, or {} when nothing matches.
+-- The view is refreshed with the sql/015 views by refresh_transaction_aggregates().
+-- Requires sql/007 (txn_date_iso) and sql/015. Safe to re-run.
+
+-- Rebuilt so a view created by an earlier version of this file picks up changes
+DROP MATERIALIZED VIEW IF EXISTS transaction_groups_mv;
+
+CREATE MATERIALIZED VIEW transaction_groups_mv AS
+SELECT date_trunc('month', txn_date_iso(t))::date AS month_start, t.card_no, t."MCC" AS mcc,
+       count(*) AS n, sum(t.source_amt) AS total,
+       -- Overall amount statistics ignore zero amounts, like the API always has
+       count(*) FILTER (WHERE t.source_amt <> 0) AS amount_n,
+       min(t.source_amt) FILTER (WHERE t.source_amt <> 0) AS minimum,
+       max(t.source_amt) FILTER (WHERE t.source_amt <> 0) AS maximum,
+       sum(t.reward_points) AS points
+FROM transactions t
+GROUP BY 1, 2, 3;
+
+-- Unique index required by REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS transaction_groups_mv_key ON transaction_groups_mv (month_start, card_no, mcc);
+
+CREATE OR REPLACE FUNCTION transaction_comprehensive(
+    card text DEFAULT NULL,
+    mcc int DEFAULT NULL,
+    month int DEFAULT NULL,
+    year int DEFAULT NULL,
+    min_amount float8 DEFAULT NULL,
+    top_n int DEFAULT NULL
+)
+RETURNS json
+LANGUAGE sql STABLE AS $$
+    WITH source AS (
+        SELECT g.month_start, g.card_no, g.mcc AS code, g.n, g.total, g.amount_n, g.minimum, g.maximum, g.points
+        FROM transaction_groups_mv g
+        WHERE min_amount IS NULL
+        UNION ALL
+        SELECT date_trunc('month', txn_date_iso(t))::date, t.card_no, t."MCC", 1, t.source_amt,
+               (t.source_amt <> 0)::int, nullif(t.source_amt, 0), nullif(t.source_amt, 0), t.reward_points
+        FROM transactions t
+        WHERE t.source_amt >= min_amount
+    ),
+    matched AS MATERIALIZED (
+        SELECT * FROM source
+        WHERE (card IS NULL OR card_no ILIKE '%' || card || '%')
+          AND (transaction_comprehensive.mcc IS NULL OR code = transaction_comprehensive.mcc)
+          AND (month IS NULL OR extract(month FROM month_start) = month)
+          AND (year IS NULL OR extract(year FROM month_start) = year)
+    ),
+    by_code AS (
+        SELECT code AS key, sum(total) AS amount, sum(n) AS count, sum(points) AS points
+        FROM matched WHERE code <> 0 GROUP BY code
+    ),
+    by_card AS (
+        SELECT card_no AS key, sum(total) AS amount, sum(n) AS count, sum(points) AS points
+        FROM matched WHERE card_no <> '' GROUP BY card_no
+    ),
+    by_month AS (
+        SELECT month_start AS key, sum(total) AS amount, sum(n) AS count, sum(points) AS points
+        FROM matched WHERE month_start IS NOT NULL GROUP BY month_start
+    )
+    SELECT CASE WHEN NOT EXISTS (SELECT 1 FROM matched) THEN '{}'::json ELSE json_build_object(
+        'overall_statistics', (
+            SELECT json_build_object(
+                'total_transactions', sum(n),
+                'total_amount', coalesce(round(sum(total)::numeric, 2), 0),
+                'average_amount', coalesce(round((sum(total) / nullif(sum(amount_n), 0))::numeric, 2), 0),
+                'min_amount', coalesce(round(min(minimum)::numeric, 2), 0),
+                'max_amount', coalesce(round(max(maximum)::numeric, 2), 0),
+                'total_reward_points', coalesce(sum(points), 0),
+                'average_reward_points', coalesce(round(sum(points)::numeric / sum(n), 2), 0)
+            )
+            FROM matched
+        ),
+        'top_mcc_codes', (
+            SELECT coalesce(json_object_agg(key, json_build_object(
+                'amount', amount, 'count', count, 'reward_points', points,
+                'average_amount', round((amount / count)::numeric, 2),
+                'total_amount', round(amount::numeric, 2)
+            ) ORDER BY amount DESC, key), '{}'::json)
+            FROM (SELECT * FROM by_code ORDER BY amount DESC, key LIMIT top_n) t
+        ),
+        'top_cards', (
+            SELECT coalesce(json_object_agg(key, json_build_object(
+                'amount', amount, 'count', count, 'reward_points', points,
+                'average_amount', round((amount / count)::numeric, 2),
+                'total_amount', round(amount::numeric, 2),
+                'card_masked', CASE WHEN length(key) >= 4 THEN '****-****-****-' || right(key, 4) ELSE key END
+            ) ORDER BY amount DESC, key), '{}'::json)
+            FROM (SELECT * FROM by_card ORDER BY amount DESC, key LIMIT top_n) t
+        ),
+        'top_months', (
+            SELECT coalesce(json_object_agg(to_char(key, 'YYYY-MM'), json_build_object(
+                'amount', amount, 'count', count, 'reward_points', points,
+                'month_name', to_char(key, 'FMMonth YYYY'),
+                'average_amount', round((amount / count)::numeric, 2),
+                'total_amount', round(amount::numeric, 2)
+            ) ORDER BY amount DESC, key), '{}'::json)
+            FROM (SELECT * FROM by_month ORDER BY amount DESC, key LIMIT top_n) t
+        ),
+        'summary', json_build_object(
+            'unique_mcc_codes', (SELECT count(*) FROM by_code),
+            'unique_cards', (SELECT count(*) FROM by_card),
+            'unique_months', (SELECT count(*) FROM by_month)
+        )
+    ) END;
+$$;
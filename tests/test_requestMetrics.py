@@ -0,0 +1,60 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from api.utilities import requestMetrics
+from api.utilities.requestMetrics import RequestMetricsMiddleware, metrics_snapshot
+
+def make_client():
+    offers = APIRouter()
+    transactions = APIRouter()
+
+    @offers.get("")
+    async def list_offers():
+        return []
+
+    @offers.get("/search")
+    async def search_offers():
+        return []
+
+    @transactions.get("/search")
+    async def search_transactions():
+        return []
+
+    @transactions.get("/by_mcc/{mcc}")
+    async def transactions_by_mcc(mcc: int):
+        return []
+
+    app = FastAPI()
+    app.include_router(offers, prefix="/offers")
+    app.include_router(transactions, prefix="/transactions")
+    app.add_middleware(RequestMetricsMiddleware)
+    return TestClient(app)
+
+def setup_function():
+    requestMetrics._routes.clear()
+
+def test_routers_sharing_a_sub_path_are_recorded_separately():
+    client = make_client()
+    client.get("/offers/search")
+    client.get("/transactions/search")
+    client.get("/transactions/search")
+
+    metrics = metrics_snapshot()
+    assert metrics["GET /offers/search"]["count"] == 1
+    assert metrics["GET /transactions/search"]["count"] == 2
+    assert "GET /search" not in metrics
+
+def test_path_parameters_share_the_route_template():
+    client = make_client()
+    client.get("/transactions/by_mcc/5411")
+    client.get("/transactions/by_mcc/5812")
+    client.get("/offers")
+
+    metrics = metrics_snapshot()
+    assert metrics["GET /transactions/by_mcc/{mcc}"]["count"] == 2
+    assert metrics["GET /offers"]["count"] == 1
+
+def test_unmatched_paths_are_not_recorded():
+    client = make_client()
+    client.get("/missing")
+
+    assert metrics_snapshot() == {}